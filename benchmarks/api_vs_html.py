@@ -0,0 +1,89 @@
+# benchmarks/api_vs_html.py - JSON API (/api/v1) vs server-rendered HTML for the same content
+#
+# Seeds a throwaway SQLite database (one category of products, a customer with a full cart and an
+# order history), then requests each page and its API equivalent through the ASGI app and reports
+# the response size and the time per request. The API lists are asked for the same number of
+# items as the HTML page shows, so both carry the same content.
+#
+# Usage: python benchmarks/api_vs_html.py [products] [orders] [repeats]
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ["FLASH_SALE_LOG"] = os.path.join(os.path.dirname(DB_PATH), "reservations.log")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT) # Templates and static files are resolved relative to the app root
+
+from fastapi.testclient import TestClient  # noqa: E402
+from database import Base, SessionLocal, engine  # noqa: E402
+import crud, schemas  # noqa: E402
+import main  # noqa: E402
+
+PRODUCTS = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+ORDERS = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+REPEATS = int(sys.argv[3]) if len(sys.argv) > 3 else 30
+
+SHIPPING = {"address": "1 Market St", "city": "Jaipur", "zip": "302001", "country": "India", "paymentMethod": "COD"}
+
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    artist = crud.create_user(db, schemas.UserCreate(email="artist@example.com", full_name="Artist", password="pw", role="artist"))
+    customer = crud.create_user(db, schemas.UserCreate(email="customer@example.com", full_name="Customer", password="pw", role="customer"))
+    products = [
+        crud.create_product(db, artist.id, f"Vase {i}", "Pottery", "Wheel-thrown stoneware. " * 20,
+                            "A story of earth and fire, shaped by hand. " * 60, 10.0 + i % 90, 1000, "vase.jpg")
+        for i in range(PRODUCTS)
+    ]
+    for i in range(ORDERS):
+        for product in products[i % PRODUCTS:i % PRODUCTS + 3]:
+            crud.add_item_to_cart(db, customer.id, product.id)
+        crud.create_order(db, customer.id, crud.get_cart_items(db, customer.id), SHIPPING)
+        crud.clear_customer_cart(db, customer.id)
+    for product in products[:10]:
+        crud.add_item_to_cart(db, customer.id, product.id)
+    product_id = products[0].id
+    db.close()
+    return product_id
+
+
+def measure(client, url):
+    client.get(url) # Warm up
+    timings, size = [], 0
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        response = client.get(url)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, (url, response.status_code)
+        size = len(response.content)
+    return size, statistics.median(timings)
+
+
+if __name__ == "__main__":
+    product_id = seed()
+    pairs = [
+        ("home", "/", "/api/v1/home"),
+        ("category", "/category/Pottery", f"/api/v1/categories/Pottery/products?limit={min(PRODUCTS, 100)}"),
+        ("product", f"/product/{product_id}", f"/api/v1/products/{product_id}"),
+        ("cart", "/customer/cart", "/api/v1/cart"),
+        ("orders", "/customer/orders", f"/api/v1/orders?limit={min(ORDERS, 100)}"),
+    ]
+    with TestClient(main.app) as client:
+        client.post("/login", data={"email": "customer@example.com", "password": "pw"})
+        print(f"{PRODUCTS} products, {ORDERS} orders, median of {REPEATS} requests")
+        print(f"{'page':<10} {'HTML bytes':>11} {'JSON bytes':>11} {'HTML ms':>9} {'JSON ms':>9}")
+        for label, html_url, api_url in pairs:
+            html_size, html_ms = measure(client, html_url)
+            api_size, api_ms = measure(client, api_url)
+            print(f"{label:<10} {html_size:>11} {api_size:>11} {html_ms:>9.2f} {api_ms:>9.2f}")
+        sparse_size, sparse_ms = measure(client, f"/api/v1/categories/Pottery/products?limit={min(PRODUCTS, 100)}&fields=id,name,price_usd")
+        print(f"{'category, fields=id,name,price_usd':<36} {sparse_size:>8} bytes {sparse_ms:>7.2f} ms")
+    os.remove(DB_PATH)
@@ -0,0 +1,179 @@
+# benchmarks/flash_sale_stress.py - Concurrent checkouts against one flash-sale product
+#
+# Seeds a throwaway SQLite database with one product in flash-sale mode and many customers, then
+# has every customer add it to their cart and check out at the same time from a thread pool,
+# while the write-behind flusher runs in the background. Halfway through, the in-memory state is
+# thrown away and rebuilt from the database and the reservation log, as after a crash, while some
+# customers have the product in their cart; they must still be able to check out afterwards.
+#
+# Checks that nothing is oversold: orders never exceed the initial stock, every unit is sold when
+# demand exceeds supply, and products.stock ends at exactly initial stock - units sold.
+#
+# Usage: python benchmarks/flash_sale_stress.py [customers] [stock] [threads]
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+TMP_DIR = tempfile.mkdtemp()
+DB_PATH = os.path.join(TMP_DIR, "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ["FLASH_SALE_LOG"] = os.path.join(TMP_DIR, "reservations.log")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func  # noqa: E402
+from database import Base, SessionLocal, engine  # noqa: E402
+import crud, models  # noqa: E402
+import services.flash_sale  # noqa: E402
+
+CUSTOMERS = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+STOCK = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+THREADS = int(sys.argv[3]) if len(sys.argv) > 3 else 64
+PENDING = 50
+
+SHIPPING = {"address": "1 Market St", "city": "Jaipur", "zip": "302001", "country": "India", "paymentMethod": "COD"}
+
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    artist = models.User(email="artist@example.com", hashed_password="x", full_name="Artist", role=models.UserRole.ARTIST)
+    db.add(artist)
+    db.flush()
+    product = crud.create_product(
+        db, owner_id=artist.id, name="Limited Vase", category="Pottery", artist_notes="",
+        ai_description="", price=40.0, stock=STOCK, image_filename="vase.jpg",
+    )
+    db.add_all([
+        models.User(email=f"customer{i}@example.com", hashed_password="x", full_name=f"Customer {i}", role=models.UserRole.CUSTOMER)
+        for i in range(CUSTOMERS)
+    ])
+    db.commit()
+    services.flash_sale.manager.enable(db, product)
+    customer_ids = [user_id for (user_id,) in db.query(models.User.id).filter(models.User.role == models.UserRole.CUSTOMER)]
+    product_id = product.id
+    db.close()
+    return product_id, customer_ids
+
+
+_results_lock = threading.Lock()
+
+def count(results, key):
+    with _results_lock:
+        results[key] += 1
+
+
+def add_to_cart(customer_id, product_id, results):
+    """What the add-to-cart route does."""
+    if not services.flash_sale.manager.reserve(customer_id, product_id):
+        count(results, "sold_out_at_cart")
+        return False
+    db = SessionLocal()
+    try:
+        crud.add_item_to_cart(db, customer_id=customer_id, product_id=product_id)
+    finally:
+        db.close()
+    return True
+
+
+def checkout(customer_id, results):
+    """What the place-order route does."""
+    db = SessionLocal()
+    try:
+        cart_items = crud.get_cart_items(db, customer_id=customer_id)
+        for attempt in range(20):
+            try:
+                crud.create_order(db, customer_id=customer_id, cart_items=cart_items, shipping_details=SHIPPING)
+                break
+            except services.flash_sale.SoldOutError:
+                count(results, "sold_out_at_checkout")
+                return
+            except Exception:
+                # SQLite "database is locked" under heavy write contention: retry like a client would.
+                # create_order has already rolled back and returned its units.
+                if attempt == 19:
+                    count(results, "errors")
+                    return
+                time.sleep(0.05)
+        crud.clear_customer_cart(db, customer_id=customer_id)
+        count(results, "orders")
+    finally:
+        db.close()
+
+
+def flusher(stop):
+    while not stop.is_set():
+        try:
+            services.flash_sale.manager._flush_once()
+        except Exception:
+            pass # Lost a lock race with a checkout; the next round catches up.
+        time.sleep(0.2)
+
+
+def run(product_id, customer_ids):
+    results = Counter()
+
+    def shopper(customer_id):
+        if add_to_cart(customer_id, product_id, results):
+            checkout(customer_id, results)
+
+    stop = threading.Event()
+    flusher_thread = threading.Thread(target=flusher, args=(stop,))
+    flusher_thread.start()
+    half = len(customer_ids) // 2
+    # These customers fill their carts before the crash and only check out after it.
+    in_flight = customer_ids[half - PENDING:half]
+    in_flight_set = set(in_flight)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        list(pool.map(shopper, customer_ids[:half - PENDING]))
+        list(pool.map(lambda customer_id: add_to_cart(customer_id, product_id, results), in_flight))
+
+    # Simulated crash: discard all in-memory state and rebuild it from the DB and the reservation log.
+    services.flash_sale.manager = services.flash_sale.FlashSaleManager(os.environ["FLASH_SALE_LOG"])
+    db = SessionLocal()
+    services.flash_sale.manager.load(db)
+    db.close()
+    recovered = services.flash_sale.manager.available(product_id)
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        # Everyone else rushes in at the same time as the in-flight customers check out.
+        list(pool.map(lambda customer_id: checkout(customer_id, results) if customer_id in in_flight_set else shopper(customer_id),
+                      in_flight + customer_ids[half:]))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    flusher_thread.join()
+    return results, recovered, elapsed
+
+
+def verify(product_id, results, recovered):
+    db = SessionLocal()
+    services.flash_sale.manager.flush(db)
+    sold = db.query(func.coalesce(func.sum(models.OrderItem.quantity), 0)).filter(models.OrderItem.product_id == product_id).scalar()
+    product = db.get(models.Product, product_id)
+    category = db.get(models.Category, product.category_id)
+    db.close()
+    print(f"units sold {sold} / stock {STOCK}, final stock {product.stock}, available after recovery {recovered}")
+    print(f"category in-stock count {category.in_stock_count}")
+    assert sold <= STOCK, "oversold"
+    assert product.stock == STOCK - sold and product.stock >= 0, "stock does not match orders"
+    assert results["orders"] == sold
+    assert results["errors"] == 0
+    assert results["sold_out_at_checkout"] == 0, "a recovered reservation was lost"
+    if CUSTOMERS > STOCK:
+        assert sold == STOCK, "undersold while demand exceeded supply"
+        assert category.in_stock_count == 0
+    print("OK: no oversell")
+
+
+if __name__ == "__main__":
+    product_id, customer_ids = seed()
+    print(f"{len(customer_ids)} customers, {STOCK} units, {THREADS} threads")
+    results, recovered, elapsed = run(product_id, customer_ids)
+    print(f"{elapsed:.2f}s: {results}  ({len(customer_ids) / elapsed:.0f} checkouts/s)")
+    verify(product_id, results, recovered)
+    os.remove(DB_PATH)
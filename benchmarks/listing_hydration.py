@@ -0,0 +1,97 @@
+# benchmarks/listing_hydration.py - ORM entities vs read_models projections for listing pages
+#
+# Seeds a throwaway SQLite database with one category of products (long descriptions and notes,
+# like real AI-written listings), then loads a page of cards both ways and reports the time per
+# page and the peak memory allocated while building it.
+#
+# Usage: python benchmarks/listing_hydration.py [cards_per_page] [repeats]
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import joinedload, undefer  # noqa: E402
+from database import Base, SessionLocal, engine  # noqa: E402
+import models, read_models  # noqa: E402
+
+CARDS = int(sys.argv[1]) if len(sys.argv) > 1 else 120
+REPEATS = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+
+def seed():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    category = models.Category(slug="pottery", name="Pottery", product_count=CARDS, in_stock_count=CARDS)
+    db.add(category)
+    artists = [
+        models.User(email=f"artist{i}@example.com", hashed_password="x", full_name=f"Artist {i}",
+                    role=models.UserRole.ARTIST, bio="About the studio. " * 100, location="Jaipur, India")
+        for i in range(20)
+    ]
+    db.add_all(artists)
+    db.flush()
+    db.add_all([
+        models.Product(
+            name=f"Vase {i}", category="Pottery", category_id=category.id, price_usd=10 + i % 90, stock=1 + i % 5,
+            image_filename=f"product_{i}.jpg", owner_id=artists[i % len(artists)].id,
+            artist_notes="Wheel-thrown stoneware, glazed twice. " * 40,
+            ai_generated_description="A story of earth and fire, shaped by hand. " * 120,
+        )
+        for i in range(CARDS)
+    ])
+    db.commit()
+    category_id = category.id
+    db.close()
+    return category_id
+
+
+def orm_page(db, category_id):
+    # What the category page did before read_models: full entities (heavy text columns included,
+    # as they were before being deferred) plus their owners.
+    products = (
+        db.query(models.Product)
+        .options(
+            joinedload(models.Product.owner).undefer(models.User.bio),
+            undefer(models.Product.artist_notes),
+            undefer(models.Product.ai_generated_description),
+        )
+        .filter(models.Product.category_id == category_id)
+        .all()
+    )
+    return [(p.id, p.name, p.price_usd, p.image_filename, p.owner.full_name) for p in products]
+
+
+def projection_page(db, category_id):
+    return read_models.get_product_cards_by_category(db, category_id)
+
+
+def measure(label, loader, category_id):
+    # Timing: a fresh session per page, as in a request.
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        db = SessionLocal()
+        loader(db, category_id)
+        db.close()
+    per_page_ms = (time.perf_counter() - start) / REPEATS * 1000
+
+    db = SessionLocal()
+    tracemalloc.start()
+    page = loader(db, category_id)
+    peak_kib = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    db.close()
+    print(f"{label:<28} {len(page):>5} cards  {per_page_ms:8.2f} ms/page  peak {peak_kib:9.1f} KiB")
+
+
+if __name__ == "__main__":
+    category_id = seed()
+    print(f"{CARDS} cards per page, {REPEATS} repeats")
+    measure("ORM entities (joinedload)", orm_page, category_id)
+    measure("read_models.ProductCard", projection_page, category_id)
+    os.remove(DB_PATH)
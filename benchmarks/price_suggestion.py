@@ -0,0 +1,94 @@
+# benchmarks/price_suggestion.py - Local pricing engine: lookup latency and backtest accuracy
+#
+# Seeds a throwaway SQLite database with a synthetic marketplace (categories with their own price
+# levels, and buyers who favour fairly priced items), then reports how long a snapshot rebuild and
+# a single suggestion take, and runs services.pricing_service.backtest on the order history.
+#
+# Usage: python benchmarks/price_suggestion.py [products] [orders] [llm_samples]
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from database import Base, SessionLocal, engine  # noqa: E402
+import models  # noqa: E402
+import services.pricing_service as pricing  # noqa: E402
+
+PRODUCTS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+ORDERS = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+LLM_SAMPLES = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+
+CATEGORIES = {"Pottery": 45, "Textiles": 70, "Jewelry": 120, "Woodwork": 90, "Painting": 220, "Paper Craft": 18}
+
+
+def seed():
+    rng = np.random.default_rng(7)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    artist = models.User(email="artist@example.com", hashed_password="x", full_name="Artist", role=models.UserRole.ARTIST)
+    customer = models.User(email="customer@example.com", hashed_password="x", full_name="Customer", role=models.UserRole.CUSTOMER)
+    db.add_all([artist, customer])
+    categories = {name: models.Category(slug=name.lower().replace(" ", "-"), name=name, product_count=0, in_stock_count=0) for name in CATEGORIES}
+    db.add_all(categories.values())
+    db.flush()
+
+    names = list(CATEGORIES)
+    product_category = rng.integers(0, len(names), PRODUCTS)
+    fair_price = np.array([CATEGORIES[names[c]] for c in product_category]) * rng.lognormal(0, 0.25, PRODUCTS)
+    # Artists misjudge their prices; overpriced items sell less.
+    markup = rng.lognormal(0, 0.35, PRODUCTS)
+    prices = np.round(fair_price * markup, 2)
+    products = [
+        models.Product(name=f"Item {i}", category=names[c], category_id=categories[names[c]].id, price_usd=float(p),
+                       stock=int(rng.integers(0, 6)), owner_id=artist.id)
+        for i, (c, p) in enumerate(zip(product_category, prices))
+    ]
+    db.add_all(products)
+    db.flush()
+
+    appeal = np.exp(-3 * np.maximum(markup - 1, 0))
+    buyers = rng.choice(PRODUCTS, size=ORDERS, p=appeal / appeal.sum())
+    start = datetime(2025, 1, 1)
+    orders = [models.Order(customer_id=customer.id, created_at=start + timedelta(minutes=10 * i), total_amount_usd=float(prices[b])) for i, b in enumerate(buyers)]
+    db.add_all(orders)
+    db.flush()
+    db.add_all([
+        models.OrderItem(order_id=order.id, product_id=products[b].id, quantity=1, price_at_purchase_usd=float(prices[b]))
+        for order, b in zip(orders, buyers)
+    ])
+    db.commit()
+    db.close()
+
+
+if __name__ == "__main__":
+    seed()
+    print(f"{PRODUCTS} products, {ORDERS} orders")
+    db = SessionLocal()
+
+    start = time.perf_counter()
+    pricing.engine.load(db)
+    print(f"snapshot rebuild          {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+    lookups = 100000
+    names = list(CATEGORIES) + ["Glass Art"]
+    start = time.perf_counter()
+    for i in range(lookups):
+        pricing.engine.suggest(db, names[i % len(names)])
+    print(f"suggestion lookup         {(time.perf_counter() - start) / lookups * 1e6:8.2f} us")
+    for name in names:
+        print(f"  {name:<12} {pricing.engine.suggest(db, name)}")
+
+    result = pricing.backtest(db, cutoff=0.7, llm_samples=LLM_SAMPLES)
+    print(f"backtest: {result['products']} products first sold after {result['cutoff']}")
+    for label in ("engine", "baseline", "llm"):
+        if label in result:
+            print(f"  {label:<9} {result[label]}")
+    db.close()
+    os.remove(DB_PATH)
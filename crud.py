@@ -1,10 +1,16 @@
 # crud.py - THE CLEAN AND FINAL VERSION
 
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload, undefer
+from sqlalchemy import func, select, case, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import models, schemas
+import services.recommendation_service
+import services.job_queue
+import services.flash_sale
 from passlib.context import CryptContext
-from typing import List
+from typing import List, Optional
+from datetime import datetime
+import re
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -28,61 +34,352 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.refresh(db_user)
     return db_user
 
-def get_all_artists(db: Session, limit: int = 8):
-    """Gets a list of all users with the 'artist' role."""
-    return db.query(models.User).filter(models.User.role == models.UserRole.ARTIST).limit(limit).all()
+def set_artist_skills(db: Session, artist: models.User, skills_text: str):
+    """Stores the typed skills string and links the artist to normalized Skill rows (no commit)."""
+    artist.skills = skills_text
+    tags = []
+    for raw in (skills_text or "").split(","):
+        slug = _slugify(raw)
+        if not slug or any(tag.slug == slug for tag in tags):
+            continue
+        skill = db.query(models.Skill).filter(models.Skill.slug == slug).first()
+        if skill is None:
+            skill = models.Skill(slug=slug, name=raw.strip())
+            db.add(skill)
+        tags.append(skill)
+    artist.skill_tags = tags
 
 
-# --- Product CRUD ---
-def get_products(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Product).order_by(models.Product.id.desc()).offset(skip).limit(limit).all()
+# --- Artist Stats CRUD ---
+def adjust_artist_stats(db: Session, artist_id: Optional[int], products: int = 0, in_stock: int = 0, units_sold: int = 0, revenue: float = 0.0):
+    """Applies deltas to an artist's stats row in one atomic upsert, creating the row if needed (no commit)."""
+    if artist_id is None:
+        return
+    table = models.ArtistStats.__table__
+    stmt = sqlite_insert(table).values(
+        artist_id=artist_id, product_count=products, in_stock_count=in_stock,
+        units_sold=units_sold, revenue_usd=revenue, average_rating=0.0,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.artist_id],
+        set_={
+            "product_count": table.c.product_count + products,
+            "in_stock_count": table.c.in_stock_count + in_stock,
+            "units_sold": table.c.units_sold + units_sold,
+            "revenue_usd": table.c.revenue_usd + revenue,
+        },
+    )
+    db.execute(stmt)
+
+def sync_artist_stats(db: Session):
+    """
+    Recomputes every artist's stats from products and order_items (two grouped queries) and
+    normalizes skills strings that were saved before the skills table existed.
+    """
+    product_counts = {
+        owner_id: (total, in_stock)
+        for owner_id, total, in_stock in db.query(
+            models.Product.owner_id, func.count(models.Product.id), func.sum(case((models.Product.stock > 0, 1), else_=0))
+        ).group_by(models.Product.owner_id)
+    }
+    sales = {
+        owner_id: (units, revenue)
+        for owner_id, units, revenue in db.query(
+            models.Product.owner_id,
+            func.sum(models.OrderItem.quantity),
+            func.sum(models.OrderItem.quantity * models.OrderItem.price_at_purchase_usd),
+        ).join(models.OrderItem, models.OrderItem.product_id == models.Product.id).group_by(models.Product.owner_id)
+    }
+    existing = {stats.artist_id: stats for stats in db.query(models.ArtistStats)}
+    for artist in db.query(models.User).options(joinedload(models.User.skill_tags)).filter(models.User.role == models.UserRole.ARTIST):
+        stats = existing.get(artist.id) or models.ArtistStats(artist_id=artist.id)
+        stats.product_count, stats.in_stock_count = product_counts.get(artist.id, (0, 0))
+        units, revenue = sales.get(artist.id, (0, 0.0))
+        stats.units_sold, stats.revenue_usd = units or 0, revenue or 0.0
+        stats.average_rating = artist.average_rating or 0.0
+        db.add(stats)
+        if artist.skills and not artist.skill_tags:
+            set_artist_skills(db, artist, artist.skills)
+            db.flush()
+    db.commit()
 
+def get_artist_version(db: Session, artist_id: int):
+    """
+    Lean lookup of what an artist profile page depends on: the artist row, the newest
+    product change and the product count (so removals also change the version).
+    Returns None if there is no artist with this id.
+    """
+    artist_updated_at = (
+        db.query(models.User.updated_at)
+        .filter(models.User.id == artist_id, models.User.role == models.UserRole.ARTIST)
+        .first()
+    )
+    if artist_updated_at is None:
+        return None
+    latest_product_change, product_count = (
+        db.query(func.max(models.Product.updated_at), func.count(models.Product.id))
+        .filter(models.Product.owner_id == artist_id)
+        .one()
+    )
+    return artist_updated_at[0], latest_product_change, product_count
+
+
+# --- Product CRUD ---
 def get_product(db: Session, product_id: int):
-    return db.query(models.Product).filter(models.Product.id == product_id).first()
+    # The detail page shows the description, which is deferred on listings.
+    return db.query(models.Product).options(undefer(models.Product.ai_generated_description)).filter(models.Product.id == product_id).first()
+
+def get_products_last_change(db: Session, product_ids: List[int]):
+    """Latest updated_at among the given products (None if there are none), for page validators."""
+    if not product_ids:
+        return None
+    return db.query(func.max(models.Product.updated_at)).filter(models.Product.id.in_(product_ids)).scalar()
+
+def get_product_version(db: Session, product_id: int):
+    """
+    Lean lookup of the timestamps a product page depends on (the product and its owner),
+    used to answer conditional GETs without loading relationships.
+    Returns None if the product does not exist.
+    """
+    return (
+        db.query(models.Product.updated_at, models.User.updated_at)
+        .outerjoin(models.User, models.Product.owner_id == models.User.id)
+        .filter(models.Product.id == product_id)
+        .first()
+    )
 
 def get_products_by_owner(db: Session, owner_id: int):
     return db.query(models.Product).filter(models.Product.owner_id == owner_id).all()
 
-def get_products_by_category(db: Session, category_name: str):
-    return db.query(models.Product).filter(models.Product.category == category_name).all()
+def apply_product_filters(query, category_id: int, price_band: Optional[str] = None, location: Optional[str] = None, in_stock_only: bool = False):
+    query = query.filter(models.Product.category_id == category_id)
+    if price_band in PRICE_BANDS:
+        low, high = PRICE_BANDS[price_band]
+        query = query.filter(models.Product.price_usd >= low)
+        if high is not None:
+            query = query.filter(models.Product.price_usd < high)
+    if location:
+        query = query.filter(models.User.location == location)
+    if in_stock_only:
+        query = query.filter(models.Product.stock > 0)
+    return query
 
-def get_trending_products(db: Session, limit: int = 8):
+# --- Category CRUD ---
+# Price bands (USD) offered as a facet on the category page, keyed by their URL value.
+PRICE_BANDS = {"0-25": (0, 25), "25-50": (25, 50), "50-100": (50, 100), "100+": (100, None)}
+
+def _slugify(text: str) -> str:
+    words = re.findall(r"[^\W_]+", (text or "").casefold())
+    return "-".join(words)
+
+def normalize_category(name: str) -> str:
+    """Matching key for a category: case-folded, punctuation dropped, words joined by '-' ("Wood work " -> "wood-work")."""
+    return _slugify(name)
+
+def get_category_by_name(db: Session, name: str):
+    return db.query(models.Category).filter(models.Category.slug == normalize_category(name)).first()
+
+def get_or_create_category(db: Session, name: str):
+    """Returns the category matching name, creating it (flushed, not committed) if needed. None for a blank name."""
+    slug = normalize_category(name)
+    if not slug:
+        return None
+    category = db.query(models.Category).filter(models.Category.slug == slug).first()
+    if category is None:
+        category = models.Category(slug=slug, name=name.strip(), product_count=0, in_stock_count=0)
+        db.add(category)
+        db.flush()
+    return category
+
+def adjust_category_counts(db: Session, category_id: Optional[int], products: int = 0, in_stock: int = 0):
+    """Applies count deltas with a single UPDATE so concurrent writers cannot lose increments."""
+    if category_id is None or (not products and not in_stock):
+        return
+    db.query(models.Category).filter(models.Category.id == category_id).update({
+        models.Category.product_count: models.Category.product_count + products,
+        models.Category.in_stock_count: models.Category.in_stock_count + in_stock,
+    }, synchronize_session=False)
+
+def get_all_categories(db: Session):
+    """Categories that have products, largest first. Reads the maintained counts; no scan of products."""
+    return (
+        db.query(models.Category)
+        .filter(models.Category.product_count > 0)
+        .order_by(models.Category.product_count.desc(), models.Category.name)
+        .all()
+    )
+
+def sync_categories(db: Session):
     """
-    Gets products ordered by the number of times they have been sold.
-    If no products have been sold, returns the most recent products as a fallback.
+    Links products that have no category_id yet (rows from before the categories table) and
+    recomputes every category's counts with one grouped query, correcting any drift.
     """
-    sold_products = (
-        db.query(models.Product)
-        .join(models.OrderItem)
-        .group_by(models.Product.id)
-        .order_by(func.sum(models.OrderItem.quantity).desc())
-        .limit(limit)
+    for product in db.query(models.Product).filter(models.Product.category_id.is_(None), models.Product.category.isnot(None)):
+        category = get_or_create_category(db, product.category)
+        if category is not None:
+            product.category_id = category.id
+    db.flush()
+    counts = {
+        category_id: (total, in_stock)
+        for category_id, total, in_stock in db.query(
+            models.Product.category_id,
+            func.count(models.Product.id),
+            func.sum(case((models.Product.stock > 0, 1), else_=0)),
+        ).group_by(models.Product.category_id)
+    }
+    for category in db.query(models.Category):
+        category.product_count, category.in_stock_count = counts.get(category.id, (0, 0))
+    db.commit()
+
+def get_category_facets(db: Session, category_id: int, price_band: Optional[str] = None, location: Optional[str] = None, in_stock_only: bool = False):
+    """
+    Facet counts for a category page from ONE grouped query over (price band, artist location, in stock).
+    Each facet's counts apply the other active filters but not its own, so the options stay selectable.
+    Returns {"price_bands": {band: n}, "locations": {location: n}, "in_stock": n, "total": n}.
+    """
+    band_expr = case(
+        *[(models.Product.price_usd < high, band) for band, (low, high) in PRICE_BANDS.items() if high is not None],
+        else_="100+",
+    )
+    rows = (
+        db.query(band_expr, models.User.location, models.Product.stock > 0, func.count(models.Product.id))
+        .outerjoin(models.User, models.Product.owner_id == models.User.id)
+        .filter(models.Product.category_id == category_id)
+        .group_by(band_expr, models.User.location, models.Product.stock > 0)
         .all()
     )
-    if sold_products:
-        return sold_products
-    # Fallback for when there are no sales yet
-    return get_products(db, limit=limit)
-
-def get_all_categories(db: Session):
-    """Gets a distinct list of all category names."""
-    return db.query(models.Product.category).distinct().all()
+    facets = {"price_bands": {band: 0 for band in PRICE_BANDS}, "locations": {}, "in_stock": 0, "total": 0}
+    for band, artist_location, has_stock, count in rows:
+        band_ok = price_band not in PRICE_BANDS or band == price_band
+        location_ok = not location or artist_location == location
+        stock_ok = not in_stock_only or has_stock
+        if location_ok and stock_ok:
+            facets["price_bands"][band] += count
+        if band_ok and stock_ok and artist_location:
+            facets["locations"][artist_location] = facets["locations"].get(artist_location, 0) + count
+        if band_ok and location_ok and has_stock:
+            facets["in_stock"] += count
+        if band_ok and location_ok and stock_ok:
+            facets["total"] += count
+    facets["locations"] = dict(sorted(facets["locations"].items(), key=lambda item: (-item[1], item[0])))
+    return facets
 
 def create_product(
     db: Session, owner_id: int, name: str, category: str, 
     artist_notes: str, ai_description: str, price: float, 
     stock: int, image_filename: str
 ):
+    db_category = get_or_create_category(db, category)
     db_product = models.Product(
         name=name, category=category, artist_notes=artist_notes,
         ai_generated_description=ai_description, price_usd=price,
-        stock=stock, image_filename=image_filename, owner_id=owner_id
+        stock=stock, image_filename=image_filename, owner_id=owner_id,
+        category_id=db_category.id if db_category else None
     )
     db.add(db_product)
+    adjust_category_counts(db, db_product.category_id, products=1, in_stock=1 if stock > 0 else 0)
+    adjust_artist_stats(db, owner_id, products=1, in_stock=1 if stock > 0 else 0)
     db.commit()
     db.refresh(db_product)
     return db_product
 
+def add_products(db: Session, owner_id: int, products: List[schemas.ProductCreate]):
+    """Adds several validated products in the caller's transaction (flushed, not committed) and returns them with ids."""
+    db_products = []
+    for p in products:
+        db_category = get_or_create_category(db, p.category)
+        db_product = models.Product(
+            name=p.name, category=p.category, artist_notes=p.artist_notes,
+            ai_generated_description=p.ai_generated_description, price_usd=p.price_usd,
+            stock=p.stock, image_filename=p.image_filename, owner_id=owner_id,
+            category_id=db_category.id if db_category else None
+        )
+        adjust_category_counts(db, db_product.category_id, products=1, in_stock=1 if p.stock > 0 else 0)
+        db_products.append(db_product)
+    adjust_artist_stats(db, owner_id, products=len(db_products), in_stock=sum(1 for p in db_products if p.stock > 0))
+    db.add_all(db_products)
+    db.flush()
+    return db_products
+
+def delete_product(db: Session, product_id: int, owner_id: int):
+    """
+    Deletes one of the owner's products and its cart entries, keeping category counts in step.
+    Products that appear in orders are kept for the order history; returns False for those.
+    """
+    db_product = db.query(models.Product).filter(models.Product.id == product_id, models.Product.owner_id == owner_id).first()
+    if not db_product:
+        return False
+    if db.query(models.OrderItem.id).filter(models.OrderItem.product_id == product_id).first():
+        return False
+    db.query(models.CartItem).filter(models.CartItem.product_id == product_id).delete()
+    db.query(models.ImportRow).filter(models.ImportRow.product_id == product_id).update({models.ImportRow.product_id: None})
+    in_stock_delta = -1 if (db_product.stock or 0) > 0 else 0
+    adjust_category_counts(db, db_product.category_id, products=-1, in_stock=in_stock_delta)
+    adjust_artist_stats(db, owner_id, products=-1, in_stock=in_stock_delta)
+    db.delete(db_product)
+    db.commit()
+    return True
+
+
+# --- Bulk Import CRUD ---
+def create_import_job(db: Session, owner_id: int, source_filename: str):
+    db_job = models.ImportJob(owner_id=owner_id, source_filename=source_filename)
+    db.add(db_job)
+    db.commit()
+    db.refresh(db_job)
+    return db_job
+
+def get_import_job(db: Session, job_id: int, owner_id: int):
+    return db.query(models.ImportJob).filter(models.ImportJob.id == job_id, models.ImportJob.owner_id == owner_id).first()
+
+def get_import_jobs_by_owner(db: Session, owner_id: int, limit: int = 20):
+    return db.query(models.ImportJob).filter(models.ImportJob.owner_id == owner_id).order_by(models.ImportJob.id.desc()).limit(limit).all()
+
+def get_unfinished_import_rows(db: Session, job_id: int, after_id: int = 0, limit: int = 50):
+    """Next batch of rows that still need work (pending, or failed on a previous run), in upload order."""
+    return (
+        db.query(models.ImportRow)
+        .filter(
+            models.ImportRow.job_id == job_id,
+            models.ImportRow.id > after_id,
+            models.ImportRow.status.in_([models.ImportRowStatus.PENDING, models.ImportRowStatus.FAILED]),
+        )
+        .order_by(models.ImportRow.id)
+        .limit(limit)
+        .all()
+    )
+
+def get_import_row_counts(db: Session, job_id: int) -> dict:
+    """{ImportRowStatus: row count} for a job, from a single grouped query."""
+    return dict(
+        db.query(models.ImportRow.status, func.count(models.ImportRow.id))
+        .filter(models.ImportRow.job_id == job_id)
+        .group_by(models.ImportRow.status)
+        .all()
+    )
+
+def get_import_row_errors(db: Session, job_id: int, limit: int = 100):
+    """(row_number, status, error) of the job's failed and invalid rows, in upload order, without loading the rows."""
+    return (
+        db.query(models.ImportRow.row_number, models.ImportRow.status, models.ImportRow.error)
+        .filter(
+            models.ImportRow.job_id == job_id,
+            models.ImportRow.status.in_([models.ImportRowStatus.FAILED, models.ImportRowStatus.INVALID]),
+        )
+        .order_by(models.ImportRow.row_number)
+        .limit(limit)
+        .all()
+    )
+
+def refresh_import_job_counts(db: Session, job: models.ImportJob):
+    """Recomputes the job's progress counters from its rows with a single grouped query."""
+    counts = get_import_row_counts(db, job.id)
+    job.done_rows = counts.get(models.ImportRowStatus.DONE, 0)
+    job.failed_rows = counts.get(models.ImportRowStatus.FAILED, 0)
+    job.invalid_rows = counts.get(models.ImportRowStatus.INVALID, 0)
+    job.total_rows = sum(counts.values())
+    return job
+
 
 # --- Cart CRUD ---
 def get_cart_items(db: Session, customer_id: int):
@@ -104,6 +401,7 @@ def remove_item_from_cart(db: Session, cart_item_id: int, customer_id: int):
     if db_item:
         db.delete(db_item)
         db.commit()
+    return db_item
 
 def clear_customer_cart(db: Session, customer_id: int):
     db.query(models.CartItem).filter(models.CartItem.customer_id == customer_id).delete()
@@ -112,29 +410,63 @@ def clear_customer_cart(db: Session, customer_id: int):
 
 # --- Order CRUD ---
 def create_order(db: Session, customer_id: int, cart_items: List[models.CartItem], shipping_details: dict):
+    """
+    Writes the order and its lines in one transaction and takes their stock: flash-sale units are
+    claimed from services.flash_sale's counters, everything else is decremented on the products row.
+    Raises services.flash_sale.SoldOutError, with nothing written, if a flash-sale item sold out.
+    """
     total = sum(item.product.price_usd * item.quantity for item in cart_items)
-    db_order = models.Order(
-        customer_id=customer_id, total_amount_usd=total,
-        shipping_address_line1=shipping_details["address"],
-        shipping_city=shipping_details["city"],
-        shipping_postal_code=shipping_details["zip"],
-        shipping_country=shipping_details["country"],
-        payment_method=shipping_details["paymentMethod"]
-    )
-    db.add(db_order)
-    db.commit()
-    
-    for item in cart_items:
-        db_order_item = models.OrderItem(
-            order_id=db_order.id, product_id=item.product_id,
-            quantity=item.quantity, price_at_purchase_usd=item.product.price_usd
-        )
-        product = item.product
-        if product:
-            product.stock -= item.quantity
-        db.add(db_order_item)
-    
-    db.commit()
+    flash_sale = services.flash_sale.manager
+    # Claiming flash-sale units, choosing each line's stock path and committing the lines happen under
+    # one lock, so no mode switch can land in between: a sale is admitted and counted by the same path.
+    with flash_sale.mode_lock:
+        hold = flash_sale.begin_checkout(customer_id, [(item.product_id, item.quantity) for item in cart_items])
+        if hold is None:
+            raise services.flash_sale.SoldOutError("An item in the cart sold out before checkout.")
+        try:
+            db_order = models.Order(
+                customer_id=customer_id, total_amount_usd=total,
+                shipping_address_line1=shipping_details["address"],
+                shipping_city=shipping_details["city"],
+                shipping_postal_code=shipping_details["zip"],
+                shipping_country=shipping_details["country"],
+                payment_method=shipping_details["paymentMethod"]
+            )
+            db.add(db_order)
+            db.flush()
+            for item in cart_items:
+                db_order_item = models.OrderItem(
+                    order_id=db_order.id, product_id=item.product_id,
+                    quantity=item.quantity, price_at_purchase_usd=item.product.price_usd
+                )
+                product = item.product
+                if product:
+                    # Flash-sale stock is admitted in memory and written behind by services.flash_sale.
+                    went_out_of_stock = False
+                    if not flash_sale.is_hot(product.id):
+                        # Re-read under the lock: disable() may have just folded write-behind sales into stock.
+                        db.refresh(product)
+                        was_in_stock = product.stock > 0
+                        product.stock -= item.quantity
+                        went_out_of_stock = was_in_stock and product.stock <= 0
+                    if went_out_of_stock:
+                        adjust_category_counts(db, product.category_id, in_stock=-1)
+                    adjust_artist_stats(
+                        db, product.owner_id, in_stock=-1 if went_out_of_stock else 0,
+                        units_sold=item.quantity, revenue=product.price_usd * item.quantity,
+                    )
+                db.add(db_order_item)
+
+            # Keep the co-purchase matrix in step with the order, in the same transaction.
+            ordered_product_ids = [item.product_id for item in cart_items]
+            services.recommendation_service.record_order_products(db, ordered_product_ids)
+            services.job_queue.enqueue(db, "refresh_recommendations", {"product_ids": sorted(set(ordered_product_ids))})
+            db.commit()
+        except Exception:
+            db.rollback()
+            flash_sale.abort_checkout(customer_id, hold)
+            raise
+    flash_sale.confirm_checkout(customer_id, hold)
     db.refresh(db_order)
     return db_order
 
@@ -144,6 +476,49 @@ def get_orders_by_customer(db: Session, customer_id: int):
 def get_orders_for_artist(db: Session, artist_id: int):
     return db.query(models.Order).join(models.OrderItem).join(models.Product).filter(models.Product.owner_id == artist_id).distinct().order_by(models.Order.created_at.desc()).all()
 
+def get_artist_order_lines(db: Session, artist_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None, after: Optional[tuple] = None, limit: int = 500):
+    """
+    One page of plain rows, one per order line of the artist's products, oldest order first, for exports.
+    Only the needed columns are selected (no ORM entities, no identity map). Pages are keyed on
+    (order_id, line_id) rather than held open as a cursor: an open SQLite read keeps its SHARED lock
+    and blocks every checkout until the download finishes.
+    Args:
+        start, end → Optional created_at bounds; start inclusive, end exclusive.
+        after → (order_id, line_id) of the previous page's last row, or None for the first page.
+    Returns:
+        List of rows; fewer than limit means it was the last page.
+    """
+    stmt = (
+        select(
+            models.Order.id.label("order_id"),
+            models.OrderItem.id.label("line_id"),
+            models.Order.created_at,
+            models.Order.status,
+            models.User.full_name.label("customer_name"),
+            models.Order.shipping_city,
+            models.Order.shipping_country,
+            models.Order.payment_method,
+            models.Product.id.label("product_id"),
+            models.Product.name.label("product_name"),
+            models.Product.category,
+            models.OrderItem.quantity,
+            models.OrderItem.price_at_purchase_usd,
+        )
+        .join(models.OrderItem, models.OrderItem.order_id == models.Order.id)
+        .join(models.Product, models.Product.id == models.OrderItem.product_id)
+        .outerjoin(models.User, models.User.id == models.Order.customer_id)
+        .where(models.Product.owner_id == artist_id)
+        .order_by(models.Order.id, models.OrderItem.id)
+        .limit(limit)
+    )
+    if start is not None:
+        stmt = stmt.where(models.Order.created_at >= start)
+    if end is not None:
+        stmt = stmt.where(models.Order.created_at < end)
+    if after is not None:
+        stmt = stmt.where(tuple_(models.Order.id, models.OrderItem.id) > tuple_(*after))
+    return db.execute(stmt).all()
+
 def update_order_status(db: Session, order_id: int, artist_id: int, new_status: models.OrderStatus):
     order_to_update = db.query(models.Order).join(models.OrderItem).join(models.Product).filter(models.Order.id == order_id, models.Product.owner_id == artist_id).first()
     if order_to_update:
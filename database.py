@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 from dotenv import load_dotenv
@@ -16,4 +16,30 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def upgrade_schema():
+    """
+    create_all() only creates missing tables, so columns and indexes added to existing models
+    never reach an existing database file. This adds them with ALTER TABLE ... ADD COLUMN and
+    CREATE INDEX IF NOT EXISTS. New columns are always added as nullable; code reading them
+    must tolerate NULL on old rows. The exception is updated_at, which is backfilled with the
+    current time: it feeds row versions (ETag / Last-Modified), and a NULL there would stay
+    constant until the row's first write, hiding edits from conditional GETs.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                if column.name == "updated_at":
+                    conn.execute(text(f'UPDATE {table.name} SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL'))
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
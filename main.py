@@ -1,20 +1,84 @@
 # main.py - The Final, Structured Version
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+import asyncio
 import os
+import random
+import time
 
-from database import engine, Base
-from routers import auth, public, artist, customer
+from database import engine, Base, SessionLocal, upgrade_schema
+from routers import auth, public, artist, customer, admin, api_v1
+from routers.auth_helpers import is_admin_session
+import services.flash_sale
+import services.job_queue
+import services.maintenance_jobs  # registers the maintenance job handlers
+import services.profiler
 
 # --- SETUP ---
 load_dotenv()
 Base.metadata.create_all(bind=engine)
-app = FastAPI()
+upgrade_schema()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Lets the request profiler follow work into worker threads.
+    services.profiler.install_thread_hooks()
+    # Reconcile denormalized counts in the background instead of blocking startup.
+    with SessionLocal() as db:
+        services.job_queue.enqueue(db, "sync_marketplace_stats", priority=10, unique=True, commit=True)
+        services.job_queue.enqueue(db, "refresh_price_snapshot", priority=5, unique=True, commit=True)
+        # Rebuild flash-sale counters from the DB and the reservation log before taking traffic.
+        services.flash_sale.manager.load(db)
+    worker_task = asyncio.create_task(services.job_queue.worker.run())
+    flusher_task = asyncio.create_task(services.flash_sale.manager.run())
+    yield
+    flusher_task.cancel()
+    await services.flash_sale.manager.stop()
+    await services.job_queue.worker.stop()
+    await worker_task
+
+app = FastAPI(lifespan=lifespan)
 
 # --- MIDDLEWARE ---
+class ProfilerMiddleware:
+    """
+    Profiles a request (stack samples + SQL, see services/profiler.py) when an operator sends the
+    X-Profile header (with an operator session, or X-Profile: <PROFILE_TOKEN>), or when it is drawn
+    in the sampled fraction of traffic. Other requests are only timed, so slow ones are still logged.
+    A plain ASGI middleware (not BaseHTTPMiddleware) so the endpoint runs in this same task and its
+    stacks can be told apart from other requests'.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        profiler = services.profiler
+        reason = None
+        header = profiler.requested_by_header(scope)
+        if header is not None and (profiler.token_matches(header) or is_admin_session(Request(scope))):
+            reason = "header"
+        elif profiler.settings.sample_rate and random.random() < profiler.settings.sample_rate:
+            reason = "sampled"
+        if reason is None:
+            start = time.perf_counter()
+            await self.app(scope, receive, send)
+            duration_ms = (time.perf_counter() - start) * 1000
+            if duration_ms >= profiler.settings.slow_ms:
+                await profiler.record_slow(scope, duration_ms)
+            return
+        await profiler.profile_request(self.app, scope, receive, send, reason)
+
+# Added before SessionMiddleware so that it runs inside it and can read the operator's session.
+app.add_middleware(ProfilerMiddleware)
+
 # SessionMiddleware is installed here, making it available to all included routers.
 SECRET_KEY = os.getenv("SECRET_KEY")
 if not SECRET_KEY:
@@ -26,4 +90,6 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 app.include_router(auth.router)
 app.include_router(public.router)
 app.include_router(artist.router)
-app.include_router(customer.router)
\ No newline at end of file
+app.include_router(customer.router)
+app.include_router(admin.router)
+app.include_router(api_v1.router)
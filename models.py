@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Enum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Enum, Index, Table, Boolean
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
 import enum
 from database import Base
@@ -8,6 +8,13 @@ class UserRole(str, enum.Enum):
     ARTIST = "artist"
     CUSTOMER = "customer"
 
+# Normalized artist skills (many-to-many); indexed both ways for "artists with skill X" lookups.
+artist_skills = Table(
+    'artist_skills', Base.metadata,
+    Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
+    Column('skill_id', Integer, ForeignKey('skills.id'), primary_key=True, index=True),
+)
+
 # models.py - Update the User model
 
 class User(Base):
@@ -23,29 +30,82 @@ class User(Base):
     # --- NEW ARTIST PROFILE FIELDS ---
     profile_picture = Column(String, nullable=True, default='default_avatar.png') # Filename
     studio_name = Column(String, nullable=True)
-    bio = Column(String, nullable=True) # This is the description
-    skills = Column(String, nullable=True) # We'll store this as a comma-separated string, e.g., "Pottery,Glazing,Sculpting"
-    location = Column(String, nullable=True) # e.g., "City, Country"
+    bio = deferred(Column(String, nullable=True)) # This is the description; deferred so listings don't load it
+    skills = Column(String, nullable=True) # As typed in the profile form, e.g. "Pottery,Glazing"; normalized into skill_tags
+    location = Column(String, nullable=True, index=True) # e.g., "City, Country"; also a category page facet
     phone_contact = Column(String, nullable=True)
     average_rating = Column(Float, default=0.0) # For the future rating system
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow) # Drives ETag / Last-Modified on public pages
     
     # --- Existing relationships ---
     products = relationship("Product", back_populates="owner")
     orders = relationship("Order", back_populates="customer")
+    stats = relationship("ArtistStats", uselist=False, back_populates="artist")
+    skill_tags = relationship("Skill", secondary=artist_skills, order_by="Skill.name")
+
+class ArtistStats(Base):
+    """
+    Materialized per-artist figures for cards, profiles and "top artists" ranking.
+    Kept up to date by crud in the same transaction as the product/order writes.
+    """
+    __tablename__ = 'artist_stats'
+    artist_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    product_count = Column(Integer, nullable=False, default=0)
+    in_stock_count = Column(Integer, nullable=False, default=0)
+    units_sold = Column(Integer, nullable=False, default=0, index=True)
+    revenue_usd = Column(Float, nullable=False, default=0.0)
+    average_rating = Column(Float, nullable=False, default=0.0) # Mirrors User.average_rating until ratings exist
+
+    artist = relationship("User", back_populates="stats")
+
+class Skill(Base):
+    __tablename__ = 'skills'
+    id = Column(Integer, primary_key=True)
+    slug = Column(String, unique=True, index=True, nullable=False)
+    name = Column(String, nullable=False)
+
+class Category(Base):
+    """
+    Normalized category. `slug` is the matching key (see crud.normalize_category), so near-duplicate
+    spellings share one row; `name` is the first spelling seen, used for display.
+    Counts are maintained by crud on product create, stock change and delete.
+    """
+    __tablename__ = 'categories'
+    id = Column(Integer, primary_key=True)
+    slug = Column(String, unique=True, index=True, nullable=False)
+    name = Column(String, nullable=False)
+    product_count = Column(Integer, nullable=False, default=0)
+    in_stock_count = Column(Integer, nullable=False, default=0)
+
+    products = relationship("Product", back_populates="category_ref")
 
 class Product(Base):
     __tablename__ = 'products'
     id = Column(Integer, primary_key=True)
     name = Column(String, index=True, nullable=False)
-    category = Column(String, index=True)
-    artist_notes = Column(String)
-    ai_generated_description = Column(String)
+    category = Column(String, index=True) # Spelling the artist entered; grouping uses category_id
+    category_id = Column(Integer, ForeignKey('categories.id'), index=True)
+    # Large text, deferred: loaded only when accessed (or undeferred, as on the detail page).
+    artist_notes = deferred(Column(String))
+    ai_generated_description = deferred(Column(String))
     price_usd = Column(Float, nullable=False)
     stock = Column(Integer, default=1)
     image_filename = Column(String)
-    owner_id = Column(Integer, ForeignKey('users.id'))
+    owner_id = Column(Integer, ForeignKey('users.id'), index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow) # Bumped on every write, incl. stock changes
+    # Flash-sale mode (services.flash_sale): stock is admitted in memory and sales are folded into
+    # `stock` in batches; the watermark is the last order_items.id already subtracted.
+    flash_sale = Column(Boolean, default=False)
+    flash_sale_watermark = Column(Integer, default=0)
     
     owner = relationship("User", back_populates="products")
+    category_ref = relationship("Category", back_populates="products")
+
+    # Composite indexes behind the category page's price-band and in-stock facets.
+    __table_args__ = (
+        Index('ix_products_category_price', 'category_id', 'price_usd'),
+        Index('ix_products_category_stock', 'category_id', 'stock'),
+    )
 
 class OrderStatus(str, enum.Enum):
     PENDING = "Pending"
@@ -57,7 +117,7 @@ class Order(Base):
     __tablename__ = 'orders'
     id = Column(Integer, primary_key=True)
     customer_id = Column(Integer, ForeignKey('users.id'))
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     status = Column(Enum(OrderStatus), default=OrderStatus.PENDING)
     total_amount_usd = Column(Float)
 
@@ -73,8 +133,8 @@ class Order(Base):
 class OrderItem(Base):
     __tablename__ = 'order_items'
     id = Column(Integer, primary_key=True)
-    order_id = Column(Integer, ForeignKey('orders.id'))
-    product_id = Column(Integer, ForeignKey('products.id'))
+    order_id = Column(Integer, ForeignKey('orders.id'), index=True)
+    product_id = Column(Integer, ForeignKey('products.id'), index=True)
     quantity = Column(Integer, nullable=False)
     price_at_purchase_usd = Column(Float, nullable=False)
 
@@ -88,4 +148,83 @@ class CartItem(Base):
     product_id = Column(Integer, ForeignKey('products.id'))
     quantity = Column(Integer, default=1)
 
-    product = relationship("Product")
\ No newline at end of file
+    product = relationship("Product")
+class ImportJobStatus(str, enum.Enum):
+    QUEUED = "Queued"
+    RUNNING = "Running"
+    COMPLETED = "Completed"
+    COMPLETED_WITH_ERRORS = "Completed with errors"
+    FAILED = "Failed"
+
+class ImportRowStatus(str, enum.Enum):
+    PENDING = "Pending"
+    DONE = "Done"
+    FAILED = "Failed"   # Enrichment or insert failed; retried when the job is resumed
+    INVALID = "Invalid" # Row did not validate; needs a corrected upload
+
+class ImportJob(Base):
+    __tablename__ = 'import_jobs'
+    id = Column(Integer, primary_key=True)
+    owner_id = Column(Integer, ForeignKey('users.id'), index=True)
+    source_filename = Column(String)
+    status = Column(Enum(ImportJobStatus), default=ImportJobStatus.QUEUED)
+    total_rows = Column(Integer, default=0)
+    done_rows = Column(Integer, default=0)
+    failed_rows = Column(Integer, default=0)
+    invalid_rows = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    rows = relationship("ImportRow", back_populates="job", cascade="all, delete-orphan")
+
+class ImportRow(Base):
+    __tablename__ = 'import_rows'
+    id = Column(Integer, primary_key=True)
+    job_id = Column(Integer, ForeignKey('import_jobs.id'), index=True)
+    row_number = Column(Integer, nullable=False)
+    status = Column(Enum(ImportRowStatus), default=ImportRowStatus.PENDING, index=True)
+    payload = Column(String) # Validated row as JSON, kept so a resumed job needs no re-upload
+    error = Column(String, nullable=True)
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=True)
+
+    job = relationship("ImportJob", back_populates="rows")
+
+    __table_args__ = (
+        Index('ix_import_rows_job_status', 'job_id', 'status', 'row_number'), # Progress counts and error listing
+    )
+
+class ProductCoPurchase(Base):
+    """Sparse product-to-product co-occurrence matrix: how many orders contained both products."""
+    __tablename__ = 'product_co_purchases'
+    product_id = Column(Integer, ForeignKey('products.id'), primary_key=True)
+    other_product_id = Column(Integer, ForeignKey('products.id'), primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "Queued"
+    RUNNING = "Running"
+    DONE = "Done"
+    DEAD = "Dead" # Gave up after max_attempts
+
+class Job(Base):
+    """Background job for services.job_queue. Rows are claimed by the in-process worker."""
+    __tablename__ = 'jobs'
+    id = Column(Integer, primary_key=True)
+    job_type = Column(String, nullable=False)
+    payload = Column(String, nullable=False, default="{}") # JSON
+    priority = Column(Integer, nullable=False, default=0) # Higher runs first
+    status = Column(Enum(JobStatus), nullable=False, default=JobStatus.QUEUED)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow) # Not before; pushed back on retry
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    locked_at = Column(DateTime, nullable=True) # Lease start; stale leases are requeued
+    last_error = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index('ix_jobs_claim', 'status', 'run_after', 'priority'),
+        Index('ix_jobs_type_status', 'job_type', 'status'),
+        Index('ix_jobs_status_finished', 'status', 'finished_at'), # Retention purge and recent-latency figures
+    )
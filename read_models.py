@@ -0,0 +1,185 @@
+# read_models.py - Read-only projections for listing pages
+#
+# Listing pages (home, category, artist profile, cart, orders, related items) and the JSON API
+# (routers/api_v1.py) only need a handful of
+# columns per card. These queries select exactly those columns and map each row into a
+# tuple-backed NamedTuple: no ORM identity map, no change tracking, and the large text columns
+# (ai_generated_description, artist_notes, bio) are never read. Use crud.py for anything that writes.
+
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from typing import List, NamedTuple, Optional
+from datetime import datetime
+import crud, models
+
+
+class ProductCard(NamedTuple):
+    id: int
+    name: str
+    category: Optional[str]
+    price_usd: float
+    stock: int
+    image_filename: Optional[str]
+    owner_id: Optional[int]
+    owner_name: Optional[str]
+
+
+class ArtistCard(NamedTuple):
+    id: int
+    full_name: Optional[str]
+    studio_name: Optional[str]
+    profile_picture: Optional[str]
+    product_count: int
+    units_sold: int
+
+
+class CartLine(NamedTuple):
+    id: int
+    quantity: int
+    product: ProductCard
+
+
+class OrderLine(NamedTuple):
+    product_id: Optional[int]
+    product_name: Optional[str]
+    quantity: int
+    price_at_purchase_usd: float
+
+
+class OrderSummary(NamedTuple):
+    id: int
+    created_at: Optional[datetime]
+    status: str
+    total_amount_usd: Optional[float]
+    items: List[OrderLine]
+
+
+_PRODUCT_CARD_COLUMNS = (
+    models.Product.id,
+    models.Product.name,
+    models.Product.category,
+    models.Product.price_usd,
+    models.Product.stock,
+    models.Product.image_filename,
+    models.Product.owner_id,
+    models.User.full_name,
+)
+
+def _product_card_select():
+    return select(*_PRODUCT_CARD_COLUMNS).outerjoin(models.User, models.Product.owner_id == models.User.id)
+
+def _product_cards(db: Session, stmt) -> List[ProductCard]:
+    return [ProductCard._make(row) for row in db.execute(stmt)]
+
+
+def _keyset(stmt, before_id: Optional[int], limit: Optional[int]):
+    # Newest first; a page continues strictly below the last id of the previous one, so deep pages
+    # cost the same as the first (no OFFSET scan) and rows added meanwhile do not shift the pages.
+    if before_id is not None:
+        stmt = stmt.where(models.Product.id < before_id)
+    stmt = stmt.order_by(models.Product.id.desc())
+    return stmt.limit(limit) if limit is not None else stmt
+
+
+# --- Product cards ---
+def get_product_cards(db: Session, skip: int = 0, limit: int = 100, before_id: Optional[int] = None) -> List[ProductCard]:
+    if before_id is not None:
+        return _product_cards(db, _keyset(_product_card_select(), before_id, limit))
+    stmt = _product_card_select().order_by(models.Product.id.desc()).offset(skip).limit(limit)
+    return _product_cards(db, stmt)
+
+def get_trending_product_cards(db: Session, limit: int = 8) -> List[ProductCard]:
+    """Best sellers by units sold; falls back to the newest products when nothing has sold yet."""
+    units_sold = (
+        select(models.OrderItem.product_id, func.sum(models.OrderItem.quantity).label("units"))
+        .group_by(models.OrderItem.product_id)
+        .subquery()
+    )
+    stmt = (
+        _product_card_select()
+        .join(units_sold, units_sold.c.product_id == models.Product.id)
+        .order_by(units_sold.c.units.desc())
+        .limit(limit)
+    )
+    return _product_cards(db, stmt) or get_product_cards(db, limit=limit)
+
+def get_product_cards_by_owner(db: Session, owner_id: int) -> List[ProductCard]:
+    stmt = _product_card_select().where(models.Product.owner_id == owner_id).order_by(models.Product.id.desc())
+    return _product_cards(db, stmt)
+
+def get_product_cards_by_category(db: Session, category_id: int, price_band: Optional[str] = None, location: Optional[str] = None, in_stock_only: bool = False, before_id: Optional[int] = None, limit: Optional[int] = None) -> List[ProductCard]:
+    stmt = crud.apply_product_filters(_product_card_select(), category_id, price_band, location, in_stock_only)
+    return _product_cards(db, _keyset(stmt, before_id, limit))
+
+def get_product_cards_by_ids(db: Session, product_ids: List[int], in_stock_only: bool = False) -> List[ProductCard]:
+    """Cards for the given ids in one IN query, in the order of product_ids."""
+    if not product_ids:
+        return []
+    stmt = _product_card_select().where(models.Product.id.in_(product_ids))
+    if in_stock_only:
+        stmt = stmt.where(models.Product.stock > 0)
+    by_id = {card.id: card for card in _product_cards(db, stmt)}
+    return [by_id[pid] for pid in product_ids if pid in by_id]
+
+
+# --- Artist cards ---
+def get_top_artist_cards(db: Session, limit: int = 8) -> List[ArtistCard]:
+    """Top artists by units sold, then revenue, as lightweight cards."""
+    stmt = (
+        select(
+            models.User.id,
+            models.User.full_name,
+            models.User.studio_name,
+            models.User.profile_picture,
+            func.coalesce(models.ArtistStats.product_count, 0),
+            func.coalesce(models.ArtistStats.units_sold, 0),
+        )
+        .outerjoin(models.ArtistStats, models.ArtistStats.artist_id == models.User.id)
+        .where(models.User.role == models.UserRole.ARTIST)
+        .order_by(
+            func.coalesce(models.ArtistStats.units_sold, 0).desc(),
+            func.coalesce(models.ArtistStats.revenue_usd, 0).desc(),
+            models.User.id,
+        )
+        .limit(limit)
+    )
+    return [ArtistCard._make(row) for row in db.execute(stmt)]
+
+
+# --- Cart ---
+def get_cart_lines(db: Session, customer_id: int) -> List[CartLine]:
+    stmt = (
+        select(models.CartItem.id, models.CartItem.quantity, *_PRODUCT_CARD_COLUMNS)
+        .join(models.Product, models.CartItem.product_id == models.Product.id)
+        .outerjoin(models.User, models.Product.owner_id == models.User.id)
+        .where(models.CartItem.customer_id == customer_id)
+        .order_by(models.CartItem.id)
+    )
+    return [CartLine(row[0], row[1], ProductCard._make(row[2:])) for row in db.execute(stmt)]
+
+
+# --- Orders ---
+def get_order_summaries(db: Session, customer_id: int, before_id: Optional[int] = None, limit: int = 20) -> List[OrderSummary]:
+    """A customer's orders, newest first (keyset-paged by id), with their lines from one more query."""
+    stmt = (
+        select(models.Order.id, models.Order.created_at, models.Order.status, models.Order.total_amount_usd)
+        .where(models.Order.customer_id == customer_id)
+    )
+    if before_id is not None:
+        stmt = stmt.where(models.Order.id < before_id)
+    orders = db.execute(stmt.order_by(models.Order.id.desc()).limit(limit)).all()
+    if not orders:
+        return []
+    lines = {}
+    line_stmt = (
+        select(models.OrderItem.order_id, models.OrderItem.product_id, models.Product.name, models.OrderItem.quantity, models.OrderItem.price_at_purchase_usd)
+        .outerjoin(models.Product, models.Product.id == models.OrderItem.product_id)
+        .where(models.OrderItem.order_id.in_([order.id for order in orders]))
+        .order_by(models.OrderItem.id)
+    )
+    for row in db.execute(line_stmt):
+        lines.setdefault(row[0], []).append(OrderLine._make(row[1:]))
+    return [
+        OrderSummary(order.id, order.created_at, order.status.value if order.status else None, order.total_amount_usd, lines.get(order.id, []))
+        for order in orders
+    ]
@@ -0,0 +1,78 @@
+# routers/admin.py - Operator pages
+
+from fastapi import APIRouter, Request, Depends, Form
+from fastapi.responses import HTMLResponse, RedirectResponse, PlainTextResponse
+from fastapi.templating import Jinja2Templates
+from sqlalchemy.orm import Session
+from datetime import datetime
+from database import get_db
+from routers.auth_helpers import admin_required
+import models
+import services.job_queue
+import services.profiler
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+templates = Jinja2Templates(directory="templates")
+
+@router.get("/jobs", response_class=HTMLResponse)
+async def job_queue_status(request: Request, db: Session = Depends(get_db), admin_auth = Depends(admin_required)):
+    if isinstance(admin_auth, RedirectResponse): return admin_auth
+    summary = services.job_queue.queue_summary(db)
+    context = {"request": request, "summary": summary, "statuses": [status.value for status in models.JobStatus]}
+    return templates.TemplateResponse("admin/jobs.html", context)
+
+@router.post("/jobs/{job_id}/retry")
+async def retry_job(request: Request, job_id: int, db: Session = Depends(get_db), admin_auth = Depends(admin_required)):
+    if isinstance(admin_auth, RedirectResponse): return admin_auth
+    job = db.query(models.Job).filter(models.Job.id == job_id, models.Job.status == models.JobStatus.DEAD).first()
+    if job:
+        job.status = models.JobStatus.QUEUED
+        job.attempts = 0
+        job.run_after = datetime.utcnow()
+        job.finished_at = None
+        db.commit()
+        services.job_queue.worker.wake()
+    return RedirectResponse(url="/admin/jobs", status_code=303)
+
+@router.post("/jobs/enqueue/{job_type}")
+async def enqueue_maintenance_job(request: Request, job_type: str, db: Session = Depends(get_db), admin_auth = Depends(admin_required)):
+    if isinstance(admin_auth, RedirectResponse): return admin_auth
+    if job_type in ("sync_marketplace_stats", "rebuild_co_purchases"):
+        services.job_queue.enqueue(db, job_type, unique=True, commit=True)
+    return RedirectResponse(url="/admin/jobs", status_code=303)
+
+@router.get("/profiles", response_class=HTMLResponse)
+async def profile_list(request: Request, admin_auth = Depends(admin_required)):
+    if isinstance(admin_auth, RedirectResponse): return admin_auth
+    context = {
+        "request": request, "entries": services.profiler.store.entries(), "settings": services.profiler.settings,
+        "capacity": services.profiler.store.capacity,
+    }
+    return templates.TemplateResponse("admin/profiles.html", context)
+
+@router.post("/profiles/settings")
+async def update_profiler_settings(request: Request, sample_rate: float = Form(...), slow_ms: float = Form(...), admin_auth = Depends(admin_required)):
+    if isinstance(admin_auth, RedirectResponse): return admin_auth
+    # Applies to this worker process until restart; PROFILE_SAMPLE_RATE / PROFILE_SLOW_MS set the defaults.
+    services.profiler.settings.sample_rate = min(max(sample_rate, 0.0), 1.0)
+    services.profiler.settings.slow_ms = max(slow_ms, 0.0)
+    return RedirectResponse(url="/admin/profiles", status_code=303)
+
+@router.get("/profiles/{seq}", response_class=HTMLResponse)
+async def profile_detail(request: Request, seq: int, admin_auth = Depends(admin_required)):
+    if isinstance(admin_auth, RedirectResponse): return admin_auth
+    entry = services.profiler.store.get(seq)
+    if entry is None:
+        return HTMLResponse("Profile not found (it may have been overwritten)", status_code=404)
+    folded = services.profiler.store.folded(seq)
+    context = {"request": request, "entry": entry, "top_frames": services.profiler.top_frames(folded) if folded else []}
+    return templates.TemplateResponse("admin/profile_detail.html", context)
+
+@router.get("/profiles/{seq}/folded")
+async def profile_folded(request: Request, seq: int, admin_auth = Depends(admin_required)):
+    """Collapsed stacks, ready for flamegraph.pl / speedscope / inferno."""
+    if isinstance(admin_auth, RedirectResponse): return admin_auth
+    folded = services.profiler.store.folded(seq)
+    if folded is None:
+        return PlainTextResponse("Profile not found", status_code=404)
+    return PlainTextResponse(folded, headers={"Content-Disposition": f'attachment; filename="profile-{seq}.folded"'})
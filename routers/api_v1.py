@@ -0,0 +1,210 @@
+"""
+routers/api_v1.py
+
+Versioned JSON API for the mobile client and in-page updates: the catalog, cart and orders,
+served from the same crud/read_models layer as the HTML pages.
+
+- Responses are encoded with orjson straight from the read-model tuples, skipping the per-field
+  validation pass on the way out. The Pydantic models in schemas.py document their shape in the
+  OpenAPI schema (via responses=, not response_model=, since nothing validates against them).
+- ?fields=id,name,price_usd returns only those product fields (sparse fieldsets).
+- Lists are keyset-paged: each page has a next_cursor to pass back as ?cursor=.
+- Every GET carries an ETag and answers If-None-Match with 304.
+- Authentication is the site session cookie; errors are JSON with the right status code.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import ORJSONResponse, Response
+from sqlalchemy.orm import Session
+from typing import Optional, Tuple
+import hashlib
+import orjson
+
+from database import get_db
+from routers.cache_helpers import build_validators, cache_headers, is_not_modified, not_modified
+import crud
+import read_models
+import schemas
+import services.flash_sale
+import services.recommendation_service
+
+router = APIRouter(prefix="/api/v1", tags=["api"], default_response_class=ORJSONResponse)
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+SPARSE_NOTE = " With ?fields=, product objects carry only the selected fields."
+
+def _documented(model, description: str = "Successful Response", status_code: int = 200) -> dict:
+    """OpenAPI documentation of a response shape; the body itself is not validated against the model."""
+    return {status_code: {"model": model, "description": description}}
+
+
+# --- Helpers ---
+def _field_selection(fields: Optional[str], model) -> Optional[Tuple[str, ...]]:
+    """Parses ?fields= against the model's fields. None means all fields."""
+    if not fields:
+        return None
+    selected = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in selected if name not in model.model_fields]
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown fields: {', '.join(unknown)}")
+    return selected or None
+
+def _product(card: read_models.ProductCard, fields: Optional[Tuple[str, ...]]) -> dict:
+    if fields is None:
+        return card._asdict()
+    return {name: getattr(card, name) for name in fields}
+
+def _cart(lines, fields=None) -> dict:
+    return {
+        "items": [{"id": line.id, "quantity": line.quantity, "product": _product(line.product, fields)} for line in lines],
+        "total_usd": round(sum(line.product.price_usd * line.quantity for line in lines), 2),
+    }
+
+def _next_cursor(rows, limit: int) -> Optional[int]:
+    return rows[-1].id if len(rows) == limit else None
+
+def _json(request: Request, payload, etag: Optional[str] = None, last_modified=None, status_code: int = 200) -> Response:
+    """
+    Encodes the payload with orjson. GET responses get an ETag (a hash of the body unless the caller
+    derived one from row versions) and a 304 when the client already has this version.
+    """
+    body = orjson.dumps(payload)
+    if request.method != "GET":
+        return Response(body, status_code=status_code, media_type="application/json")
+    etag = etag or f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+    headers = cache_headers(request, etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(headers)
+    return Response(body, status_code=status_code, media_type="application/json", headers=headers)
+
+def api_user(request: Request) -> dict:
+    """Session user for the API: a 401 instead of the HTML login redirect."""
+    user = request.session.get("user")
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+    return user
+
+
+# --- Catalog ---
+@router.get("/home", responses=_documented(schemas.HomeOut, "Home page content." + SPARSE_NOTE))
+async def home(request: Request, fields: Optional[str] = None, db: Session = Depends(get_db)):
+    """Everything on the home page: trending products, categories and top artists."""
+    selected = _field_selection(fields, schemas.ProductCardOut)
+    payload = {
+        "trending": [_product(card, selected) for card in read_models.get_trending_product_cards(db, limit=8)],
+        "categories": [
+            {"slug": c.slug, "name": c.name, "product_count": c.product_count, "in_stock_count": c.in_stock_count}
+            for c in crud.get_all_categories(db)
+        ],
+        "top_artists": [card._asdict() for card in read_models.get_top_artist_cards(db, limit=8)],
+    }
+    return _json(request, payload)
+
+@router.get("/categories", responses=_documented(list[schemas.CategoryOut]))
+async def list_categories(request: Request, db: Session = Depends(get_db)):
+    return _json(request, [
+        {"slug": c.slug, "name": c.name, "product_count": c.product_count, "in_stock_count": c.in_stock_count}
+        for c in crud.get_all_categories(db)
+    ])
+
+@router.get("/products", responses=_documented(schemas.ProductPage, "A page of products." + SPARSE_NOTE))
+async def list_products(
+    request: Request, cursor: Optional[int] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None, db: Session = Depends(get_db),
+):
+    """All products, newest first."""
+    selected = _field_selection(fields, schemas.ProductCardOut)
+    cards = read_models.get_product_cards(db, limit=limit, before_id=cursor)
+    return _json(request, {"items": [_product(card, selected) for card in cards], "next_cursor": _next_cursor(cards, limit)})
+
+@router.get("/categories/{category_name}/products", responses=_documented(schemas.ProductPage, "A page of the category's products." + SPARSE_NOTE))
+async def list_category_products(
+    request: Request, category_name: str, price: Optional[str] = None, location: Optional[str] = None, in_stock: bool = False,
+    facets: bool = False, cursor: Optional[int] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None, db: Session = Depends(get_db),
+):
+    """
+    A category's products with the same filters as the category page. facets=true adds the facet
+    counts (one grouped query); clients usually ask for them with the first page only.
+    """
+    category = crud.get_category_by_name(db, category_name)
+    if category is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
+    selected = _field_selection(fields, schemas.ProductCardOut)
+    price_band = price if price in crud.PRICE_BANDS else None
+    cards = read_models.get_product_cards_by_category(
+        db, category_id=category.id, price_band=price_band, location=location, in_stock_only=in_stock, before_id=cursor, limit=limit,
+    )
+    payload = {"items": [_product(card, selected) for card in cards], "next_cursor": _next_cursor(cards, limit)}
+    if facets:
+        payload["facets"] = crud.get_category_facets(db, category_id=category.id, price_band=price_band, location=location, in_stock_only=in_stock)
+    return _json(request, payload)
+
+@router.get("/products/{product_id}", responses=_documented(schemas.ProductDetailOut, "The product. With ?fields=, only the selected fields."))
+async def product_detail(request: Request, product_id: int, fields: Optional[str] = None, db: Session = Depends(get_db)):
+    """One product with its description and related product ids."""
+    selected = _field_selection(fields, schemas.ProductDetailOut)
+    version = crud.get_product_version(db, product_id=product_id)
+    if not version:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    # Same validators as the HTML page (plus the field selection), checked before loading anything.
+    related_ids = services.recommendation_service.index.related(db, product_id)
+    etag, last_modified = build_validators(request, "api", fields, *version, tuple(related_ids))
+    headers = cache_headers(request, etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(headers)
+
+    product = crud.get_product(db, product_id=product_id)
+    payload = {
+        "id": product.id, "name": product.name, "category": product.category, "price_usd": product.price_usd,
+        "stock": product.stock, "image_filename": product.image_filename, "owner_id": product.owner_id,
+        "owner_name": product.owner.full_name if product.owner else None,
+        "description": product.ai_generated_description, "artist_notes": product.artist_notes,
+        "flash_sale": bool(product.flash_sale), "related_ids": related_ids,
+    }
+    if selected is not None:
+        payload = {name: payload[name] for name in selected}
+    return _json(request, payload, etag=etag, last_modified=last_modified)
+
+
+# --- Cart ---
+@router.get("/cart", responses=_documented(schemas.CartOut, "The cart." + SPARSE_NOTE))
+async def view_cart(request: Request, fields: Optional[str] = None, user: dict = Depends(api_user), db: Session = Depends(get_db)):
+    selected = _field_selection(fields, schemas.ProductCardOut)
+    return _json(request, _cart(read_models.get_cart_lines(db, customer_id=user["id"]), selected))
+
+@router.post("/cart/items", status_code=status.HTTP_201_CREATED, responses=_documented(schemas.CartOut, "The updated cart.", status.HTTP_201_CREATED))
+async def add_to_cart(request: Request, item: schemas.CartItemIn, user: dict = Depends(api_user), db: Session = Depends(get_db)):
+    """Adds one unit of a product and returns the updated cart. 409 if a flash-sale product is sold out."""
+    if crud.get_product_version(db, product_id=item.product_id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    flash_sale = services.flash_sale.manager
+    if flash_sale.is_hot(item.product_id) and not flash_sale.reserve(user["id"], item.product_id):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Sold out")
+    crud.add_item_to_cart(db, customer_id=user["id"], product_id=item.product_id)
+    return _json(request, _cart(read_models.get_cart_lines(db, customer_id=user["id"])), status_code=status.HTTP_201_CREATED)
+
+@router.delete("/cart/items/{cart_item_id}", responses=_documented(schemas.CartOut, "The updated cart."))
+async def remove_from_cart(request: Request, cart_item_id: int, user: dict = Depends(api_user), db: Session = Depends(get_db)):
+    removed = crud.remove_item_from_cart(db, cart_item_id=cart_item_id, customer_id=user["id"])
+    if removed is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cart item not found")
+    services.flash_sale.manager.release(user["id"], removed.product_id)
+    return _json(request, _cart(read_models.get_cart_lines(db, customer_id=user["id"])))
+
+
+# --- Orders ---
+@router.get("/orders", responses=_documented(schemas.OrderPage))
+async def list_orders(
+    request: Request, cursor: Optional[int] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user: dict = Depends(api_user), db: Session = Depends(get_db),
+):
+    """The customer's orders with their lines, newest first."""
+    orders = read_models.get_order_summaries(db, customer_id=user["id"], before_id=cursor, limit=limit)
+    payload = {
+        "items": [{**order._asdict(), "items": [line._asdict() for line in order.items]} for order in orders],
+        "next_cursor": _next_cursor(orders, limit),
+    }
+    return _json(request, payload)
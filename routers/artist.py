@@ -16,14 +16,24 @@ templates (Jinja2Templates) → Jinja2 template renderer for HTML responses.
 """
 
 from fastapi import APIRouter, Request, Depends, Form, File, UploadFile
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_db, SessionLocal
+from datetime import date, datetime, time as dt_time, timedelta
+from typing import Optional
 import crud
 import models
 import os
 import services.ai_service
+import services.flash_sale
+import services.import_service
+import services.pricing_service
+import services.job_queue
+import csv
+import io
+import json
 import shutil
 import time
 
@@ -118,7 +128,8 @@ async def add_product_step1_submit(request: Request, name: str = Form(...), cate
 @router.get("/products/review", response_class=HTMLResponse)
 async def add_product_step2_page(request: Request, user_auth = Depends(is_artist)):
     """
-    Displays product review page with AI-generated description and price suggestion.
+    Displays the product review page straight away; the AI description streams in from
+    /products/review/description-stream and the price suggestion loads from /products/review/price.
     Args:
         request (Request) → Current request.
         user_auth → Result of is_artist dependency.
@@ -130,11 +141,86 @@ async def add_product_step2_page(request: Request, user_auth = Depends(is_artist
     if not product_data:
         flash(request, "Session expired. Please start again.", "warning")
         return RedirectResponse(url="/artist/manage/products/new", status_code=303)
-    ai_description = services.ai_service.generate_product_description(name=product_data["name"], category=product_data["category"], artist_notes=product_data["artist_notes"])
-    ai_price_suggestion = services.ai_service.suggest_product_price(name=product_data["name"], category=product_data["category"], artist_notes=product_data["artist_notes"])
-    context = {"request": request, "product_data": product_data, "ai_description": ai_description, "ai_price_suggestion": ai_price_suggestion}
+    context = {"request": request, "product_data": product_data}
     return templates.TemplateResponse("artist/add_product_step2.html", context)
 
+def _sse_event(data, event: str = None) -> str:
+    # JSON-encode the payload so newlines in generated text cannot break the SSE framing.
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+def _description_events(product_data: dict):
+    try:
+        for chunk in services.ai_service.stream_product_description(name=product_data["name"], category=product_data["category"], artist_notes=product_data["artist_notes"]):
+            yield _sse_event(chunk)
+    except services.ai_service.AIServiceError as e:
+        yield _sse_event(str(e), event="error")
+    yield _sse_event("", event="done")
+
+@router.get("/products/review/description-stream")
+async def stream_product_description(request: Request, user_auth = Depends(is_artist)):
+    """
+    Relays the AI description to the review page as server-sent events, one per model chunk.
+    Args:
+        request (Request) → Current request.
+        user_auth → Result of is_artist dependency.
+    Returns:
+        StreamingResponse (text/event-stream), or 404 if there is no product in progress.
+    """
+    if isinstance(user_auth, RedirectResponse): return user_auth
+    product_data = request.session.get("product_creation_data")
+    if not product_data:
+        return JSONResponse({"detail": "No product in progress"}, status_code=404)
+    # The generator is synchronous, so StreamingResponse iterates it in a worker thread.
+    return StreamingResponse(_description_events(product_data), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.get("/products/review/price")
+async def product_price_suggestion(request: Request, db: Session = Depends(get_db), user_auth = Depends(is_artist)):
+    """
+    Returns the price suggestion for the product in progress, computed locally from marketplace
+    prices and sales (services/pricing_service.py). Falls back to the AI while there is no data.
+    Args:
+        request (Request) → Current request.
+        db (Session) → Database session.
+        user_auth → Result of is_artist dependency.
+    Returns:
+        JSONResponse {"suggestion": str, plus low, high, suggested, median, sell_through, sample_size, units_sold, basis when computed locally}.
+    """
+    if isinstance(user_auth, RedirectResponse): return user_auth
+    product_data = request.session.get("product_creation_data")
+    if not product_data:
+        return JSONResponse({"detail": "No product in progress"}, status_code=404)
+    suggestion = services.pricing_service.engine.suggest(db, product_data["category"])
+    if suggestion is None:
+        text = await run_in_threadpool(services.ai_service.suggest_product_price, name=product_data["name"], category=product_data["category"], artist_notes=product_data["artist_notes"])
+        return JSONResponse({"suggestion": text})
+    return JSONResponse({"suggestion": suggestion.as_text(), **suggestion._asdict()})
+
+@router.get("/products/review/price/justification")
+async def product_price_justification(request: Request, db: Session = Depends(get_db), user_auth = Depends(is_artist)):
+    """
+    Asks the AI to explain the locally computed price range for the product in progress. Optional:
+    only called when the artist asks for it.
+    Args:
+        request (Request) → Current request.
+        db (Session) → Database session.
+        user_auth → Result of is_artist dependency.
+    Returns:
+        JSONResponse {"justification": str}.
+    """
+    if isinstance(user_auth, RedirectResponse): return user_auth
+    product_data = request.session.get("product_creation_data")
+    if not product_data:
+        return JSONResponse({"detail": "No product in progress"}, status_code=404)
+    suggestion = services.pricing_service.engine.suggest(db, product_data["category"])
+    if suggestion is None:
+        return JSONResponse({"detail": "No price data yet"}, status_code=404)
+    justification = await run_in_threadpool(
+        services.ai_service.explain_price_suggestion, name=product_data["name"], category=product_data["category"], artist_notes=product_data["artist_notes"],
+        low=suggestion.low, high=suggestion.high, median=suggestion.median, sell_through=suggestion.sell_through,
+    )
+    return JSONResponse({"justification": justification})
+
 @router.post("/products/save")
 async def save_product(request: Request, db: Session = Depends(get_db), ai_generated_description: str = Form(...), price_usd: float = Form(...), stock: int = Form(...), name: str = Form(...), category: str = Form(...), artist_notes: str = Form(...), image_filename: str = Form(...)):
     """
@@ -154,6 +240,206 @@ async def save_product(request: Request, db: Session = Depends(get_db), ai_gener
         del request.session["product_creation_data"]
     return RedirectResponse(url="/artist/manage/dashboard?tab=products", status_code=303)
 
+@router.post("/products/{product_id}/delete")
+async def delete_product(request: Request, product_id: int, db: Session = Depends(get_db), user_auth = Depends(is_artist)):
+    """
+    Deletes one of the artist's products, unless it has already been ordered.
+    Args:
+        product_id (int)
+    Returns:
+        RedirectResponse to the products tab.
+    """
+    if isinstance(user_auth, RedirectResponse): return user_auth
+    if crud.delete_product(db, product_id=product_id, owner_id=request.session["user"]["id"]):
+        services.flash_sale.manager.forget(product_id)
+        flash(request, "Product deleted.", "success")
+    else:
+        flash(request, "This product has orders and cannot be deleted.", "warning")
+    return RedirectResponse(url="/artist/manage/dashboard?tab=products", status_code=303)
+
+@router.post("/products/{product_id}/flash-sale")
+async def toggle_flash_sale(request: Request, product_id: int, enabled: bool = Form(...), db: Session = Depends(get_db), user_auth = Depends(is_artist)):
+    """
+    Switches flash-sale mode for one of the artist's products. In flash-sale mode stock is admitted
+    through in-memory reservations and written back in batches (see services/flash_sale.py).
+    Args:
+        product_id (int)
+        enabled (bool) → Form field, true to start the sale and false to end it.
+    Returns:
+        RedirectResponse to the products tab.
+    """
+    if isinstance(user_auth, RedirectResponse): return user_auth
+    product = crud.get_product(db, product_id=product_id)
+    if product is None or product.owner_id != request.session["user"]["id"]:
+        flash(request, "Product not found.", "danger")
+        return RedirectResponse(url="/artist/manage/dashboard?tab=products", status_code=303)
+    if enabled:
+        await run_in_threadpool(services.flash_sale.manager.enable, db, product)
+        flash(request, f"Flash sale started for {product.name}.", "success")
+    else:
+        await run_in_threadpool(services.flash_sale.manager.disable, db, product)
+        flash(request, f"Flash sale ended for {product.name}.", "info")
+    return RedirectResponse(url="/artist/manage/dashboard?tab=products", status_code=303)
+
+@router.get("/products/import", response_class=HTMLResponse)
+async def bulk_import_page(request: Request, db: Session = Depends(get_db), user_auth = Depends(is_artist)):
+    """
+    Displays the bulk import form and the artist's recent import jobs.
+    Args:
+        request (Request) → Current request.
+        db (Session) → Database session.
+        user_auth → Result of is_artist dependency.
+    Returns:
+        TemplateResponse or RedirectResponse.
+    """
+    if isinstance(user_auth, RedirectResponse): return user_auth
+    jobs = crud.get_import_jobs_by_owner(db, owner_id=request.session["user"]["id"])
+    return templates.TemplateResponse("artist/bulk_import.html", {"request": request, "jobs": jobs})
+
+@router.post("/products/import")
+async def bulk_import_submit(request: Request, db: Session = Depends(get_db), user_auth = Depends(is_artist), rows_file: UploadFile = File(...), images: UploadFile = File(None)):
+    """
+    Stages a CSV/JSONL catalog plus a zip of images, then queues a "bulk_import" job to process it.
+    Args:
+        rows_file (UploadFile) → .csv or .jsonl with name, category, artist_notes, price_usd, stock, ai_generated_description, image.
+        images (UploadFile, optional) → .zip containing the images referenced by the rows.
+    Returns:
+        RedirectResponse to the import page.
+    """
+    if isinstance(user_auth, RedirectResponse): return user_auth
+    if not rows_file.filename.lower().endswith((".csv", ".jsonl", ".ndjson")):
+        flash(request, "Please upload a .csv or .jsonl file.", "danger")
+        return RedirectResponse(url="/artist/manage/products/import", status_code=303)
+    archive = images.file if images and images.filename else None
+    try:
+        # Unzipping and the batched inserts are blocking; keep them off the event loop.
+        job = await run_in_threadpool(services.import_service.stage_import, db, owner_id=request.session["user"]["id"], rows_file=rows_file.file, filename=rows_file.filename, archive_file=archive)
+    except services.import_service.ImportFileError as e:
+        flash(request, str(e), "danger")
+        return RedirectResponse(url="/artist/manage/products/import", status_code=303)
+    services.job_queue.enqueue(db, "bulk_import", {"job_id": job.id, "owner_id": job.owner_id}, commit=True)
+    flash(request, f"Import #{job.id} started with {job.total_rows} rows ({job.invalid_rows} invalid).", "success")
+    return RedirectResponse(url="/artist/manage/products/import", status_code=303)
+
+@router.get("/products/import/{job_id}")
+async def bulk_import_status(request: Request, job_id: int, db: Session = Depends(get_db), user_auth = Depends(is_artist)):
+    """
+    Progress of an import job, for polling.
+    Args:
+        job_id (int)
+    Returns:
+        JSONResponse with row counts, status and the errors of failed/invalid rows.
+    """
+    if isinstance(user_auth, RedirectResponse): return user_auth
+    job = crud.get_import_job(db, job_id=job_id, owner_id=request.session["user"]["id"])
+    if not job:
+        return JSONResponse({"detail": "Import job not found"}, status_code=404)
+    # Polled every few seconds: counts from one grouped query, errors as plain columns, never the rows themselves.
+    counts = crud.get_import_row_counts(db, job_id=job.id)
+    errors = [
+        {"row": row_number, "status": status.value, "error": error}
+        for row_number, status, error in crud.get_import_row_errors(db, job_id=job.id, limit=100)
+    ]
+    return JSONResponse({
+        "id": job.id, "status": job.status.value, "running": services.import_service.is_running(job.id),
+        "total_rows": sum(counts.values()), "done_rows": counts.get(models.ImportRowStatus.DONE, 0),
+        "failed_rows": counts.get(models.ImportRowStatus.FAILED, 0), "invalid_rows": counts.get(models.ImportRowStatus.INVALID, 0),
+        "errors": errors,
+    })
+
+@router.post("/products/import/{job_id}/resume")
+async def bulk_import_resume(request: Request, job_id: int, db: Session = Depends(get_db), user_auth = Depends(is_artist)):
+    """
+    Re-runs an import job; only rows that are still pending or previously failed are processed.
+    Args:
+        job_id (int)
+    Returns:
+        RedirectResponse to the import page.
+    """
+    if isinstance(user_auth, RedirectResponse): return user_auth
+    job = crud.get_import_job(db, job_id=job_id, owner_id=request.session["user"]["id"])
+    if not job:
+        flash(request, "Import job not found.", "danger")
+    elif services.import_service.is_running(job.id):
+        flash(request, f"Import #{job.id} is already running.", "warning")
+    else:
+        services.job_queue.enqueue(db, "bulk_import", {"job_id": job.id, "owner_id": job.owner_id}, unique=True, commit=True)
+        flash(request, f"Import #{job.id} resumed.", "success")
+    return RedirectResponse(url="/artist/manage/products/import", status_code=303)
+
+EXPORT_COLUMNS = [
+    "order_id", "created_at", "status", "customer_name", "shipping_city", "shipping_country", "payment_method",
+    "product_id", "product_name", "category", "quantity", "price_at_purchase_usd", "line_total_usd",
+]
+EXPORT_PAGE_ROWS = 200 # Rows read per query and written to the client as one chunk
+
+def _export_row(row) -> list:
+    return [
+        row.order_id, row.created_at.isoformat() if row.created_at else "", row.status.value if row.status else "",
+        row.customer_name, row.shipping_city, row.shipping_country, row.payment_method,
+        row.product_id, row.product_name, row.category, row.quantity, row.price_at_purchase_usd,
+        round(row.price_at_purchase_usd * row.quantity, 2),
+    ]
+
+def _order_export_chunks(artist_id: int, export_format: str, start: Optional[datetime], end: Optional[datetime]):
+    """
+    Yields the export body in chunks. Each page of rows is read in its own short session (the
+    request's session is closed before a streaming response finishes), so no read stays open
+    while the client downloads.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == "csv":
+        writer.writerow(EXPORT_COLUMNS)
+        # Send the header right away so the download starts before the query has produced anything.
+        yield buffer.getvalue()
+        buffer.seek(0); buffer.truncate()
+    after = None
+    while True:
+        with SessionLocal() as db:
+            rows = crud.get_artist_order_lines(db, artist_id=artist_id, start=start, end=end, after=after, limit=EXPORT_PAGE_ROWS)
+        for row in rows:
+            values = _export_row(row)
+            if export_format == "csv":
+                writer.writerow(values)
+            else:
+                buffer.write(json.dumps(dict(zip(EXPORT_COLUMNS, values))) + "\n")
+        if buffer.tell():
+            yield buffer.getvalue()
+            buffer.seek(0); buffer.truncate()
+        if len(rows) < EXPORT_PAGE_ROWS:
+            break
+        after = (rows[-1].order_id, rows[-1].line_id)
+
+@router.get("/exports/orders.{export_format}")
+async def export_orders(request: Request, export_format: str, start: Optional[str] = None, end: Optional[str] = None, user_auth = Depends(is_artist)):
+    """
+    Streams the artist's full order history, one line per item sold, as CSV or JSONL.
+    Args:
+        export_format (str) → "csv" or "jsonl".
+        start (str, optional) → First day to include, YYYY-MM-DD (blank means no bound).
+        end (str, optional) → Last day to include, YYYY-MM-DD (blank means no bound).
+    Returns:
+        StreamingResponse download.
+    """
+    if isinstance(user_auth, RedirectResponse): return user_auth
+    if export_format not in ("csv", "jsonl"):
+        return JSONResponse({"detail": "Supported formats are csv and jsonl"}, status_code=404)
+    try:
+        start = date.fromisoformat(start) if start else None
+        end = date.fromisoformat(end) if end else None
+    except ValueError:
+        return JSONResponse({"detail": "Dates must be YYYY-MM-DD"}, status_code=400)
+    start_at = datetime.combine(start, dt_time.min) if start else None
+    end_before = datetime.combine(end + timedelta(days=1), dt_time.min) if end else None
+    filename = f"orders_{start or 'all'}_{end or 'now'}.{export_format}"
+    media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _order_export_chunks(request.session["user"]["id"], export_format, start_at, end_before),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Accel-Buffering": "no"},
+    )
+
 @router.post("/orders/update/{order_id}")
 async def update_order(request: Request, order_id: int, db: Session = Depends(get_db), user_auth = Depends(is_artist), status: models.OrderStatus = Form(...)):
     """
@@ -202,7 +488,7 @@ async def handle_edit_artist_profile(request: Request, db: Session = Depends(get
     artist.studio_name = studio_name
     artist.location = location
     artist.phone_contact = phone_contact
-    artist.skills = skills
+    crud.set_artist_skills(db, artist, skills)
     artist.bio = bio
     
     if profile_picture and profile_picture.filename:
@@ -3,6 +3,7 @@ from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
 from database import get_db
 import crud
+import os
 
 # Dependency to get the current user from the session
 def get_current_user(request: Request, db: Session = Depends(get_db)):
@@ -22,4 +23,17 @@ def login_required(request: Request):
             request.session['flash_messages'] = []
         request.session['flash_messages'].append(('warning', 'You need to be logged in to view this page.'))
         return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
-    return True
\ No newline at end of file
+    return True
+
+# Operators are configured by email, e.g. ADMIN_EMAILS="ops@artiflex.com,me@artiflex.com"
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
+
+def is_admin_session(request: Request) -> bool:
+    user = request.session.get("user")
+    return bool(user) and user.get("email", "").lower() in ADMIN_EMAILS
+
+# Dependency to protect operator-only routes
+def admin_required(request: Request):
+    if not is_admin_session(request):
+        return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
+    return True
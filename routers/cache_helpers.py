@@ -0,0 +1,67 @@
+from fastapi import Request
+from fastapi.responses import Response
+from email.utils import format_datetime, parsedate_to_datetime
+from datetime import datetime, timezone
+import hashlib
+import os
+
+# How long a shared cache (e.g. a local reverse proxy) may serve an anonymous page without revalidating.
+PUBLIC_PAGE_MAX_AGE = int(os.getenv("PUBLIC_PAGE_MAX_AGE", "60"))
+
+def _viewer_key(request: Request) -> str:
+    # Pages render differently for guests, customers and artists (navbar, Add to Cart), so the ETag must too.
+    user = request.session.get("user")
+    return f"user:{user['id']}" if user else "anon"
+
+def _is_cacheable(request: Request) -> bool:
+    # Pending flash messages are popped and rendered into the page, so it has to be rebuilt.
+    return not request.session.get("flash_messages")
+
+def build_validators(request: Request, *versions):
+    """
+    Derives a weak ETag and Last-Modified time from the row versions a page depends on.
+    Args:
+        request (Request) → Current request.
+        versions → updated_at timestamps (may be None on legacy rows), counts, etc.
+    Returns:
+        (etag, last_modified) where last_modified may be None.
+    """
+    raw = "|".join([_viewer_key(request)] + [v.isoformat() if isinstance(v, datetime) else str(v) for v in versions])
+    etag = f'W/"{hashlib.sha1(raw.encode()).hexdigest()[:20]}"'
+    timestamps = [v for v in versions if isinstance(v, datetime)]
+    last_modified = max(timestamps).replace(microsecond=0, tzinfo=timezone.utc) if timestamps else None
+    return etag, last_modified
+
+def cache_headers(request: Request, etag: str, last_modified) -> dict:
+    headers = {"ETag": etag, "Vary": "Cookie"}
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    if request.session.get("user") or not _is_cacheable(request):
+        headers["Cache-Control"] = "private, no-cache"
+    else:
+        headers["Cache-Control"] = f"public, max-age=0, s-maxage={PUBLIC_PAGE_MAX_AGE}"
+    return headers
+
+def is_not_modified(request: Request, etag: str, last_modified) -> bool:
+    """
+    Evaluates If-None-Match (weak comparison), falling back to If-Modified-Since
+    only when the client sent no If-None-Match, as RFC 9110 requires.
+    """
+    if not _is_cacheable(request):
+        return False
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        opaque = etag.removeprefix("W/")
+        return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def not_modified(headers: dict) -> Response:
+    return Response(status_code=304, headers=headers)
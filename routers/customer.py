@@ -4,7 +4,7 @@ from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 from database import get_db
 from routers.auth_helpers import get_current_user, login_required
-import crud, services.payment_service
+import crud, read_models, services.payment_service, services.flash_sale
 from models import User
 
 router = APIRouter(prefix="/customer", tags=["customer"], dependencies=[Depends(login_required)])
@@ -17,7 +17,7 @@ def flash(request: Request, message: str, category: str = "success"):
 
 @router.get("/cart", response_class=HTMLResponse)
 async def view_cart(request: Request, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    cart_items = crud.get_cart_items(db, customer_id=current_user.id)
+    cart_items = read_models.get_cart_lines(db, customer_id=current_user.id)
     total = sum(item.product.price_usd * item.quantity for item in cart_items)
     
     currency = request.session.get('currency', 'USD')
@@ -35,14 +35,21 @@ async def view_cart(request: Request, db: Session = Depends(get_db), current_use
 
 @router.post("/cart/add/{product_id}")
 async def add_to_cart(request: Request, product_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    referer = request.headers.get("referer", "/")
+    flash_sale = services.flash_sale.manager
+    # Flash-sale products are admitted in memory: the cart line holds a reservation.
+    if flash_sale.is_hot(product_id) and not flash_sale.reserve(current_user.id, product_id):
+        flash(request, "Sorry, this item is sold out.", "warning")
+        return RedirectResponse(url=referer, status_code=303)
     crud.add_item_to_cart(db, customer_id=current_user.id, product_id=product_id)
     flash(request, "Item added to cart!", "success")
-    referer = request.headers.get("referer", "/")
     return RedirectResponse(url=referer, status_code=303)
     
 @router.post("/cart/remove/{cart_item_id}")
 async def remove_from_cart(request: Request, cart_item_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    crud.remove_item_from_cart(db, cart_item_id=cart_item_id, customer_id=current_user.id)
+    removed = crud.remove_item_from_cart(db, cart_item_id=cart_item_id, customer_id=current_user.id)
+    if removed:
+        services.flash_sale.manager.release(current_user.id, removed.product_id)
     flash(request, "Item removed from cart.", "info")
     return RedirectResponse(url="/customer/cart", status_code=303)
 
@@ -80,7 +87,7 @@ async def checkout_details_page(request: Request, db: Session = Depends(get_db),
         flash(request, "Invalid checkout session. Please start again from your cart.", "warning")
         return RedirectResponse(url="/customer/cart", status_code=303)
 
-    cart_items = crud.get_cart_items(db, customer_id=current_user.id)
+    cart_items = read_models.get_cart_lines(db, customer_id=current_user.id)
     total = sum(item.product.price_usd * item.quantity for item in cart_items)
     
     context = {
@@ -118,13 +125,17 @@ async def place_order(
         "zip": zip, "paymentMethod": paymentMethod
     }
 
-    # Create the order in the database
-    order = crud.create_order(
-        db, 
-        customer_id=current_user.id, 
-        cart_items=cart_items,
-        shipping_details=shipping_details
-    )
+    # Create the order in the database; flash-sale units are claimed in the same step.
+    try:
+        order = crud.create_order(
+            db, 
+            customer_id=current_user.id, 
+            cart_items=cart_items,
+            shipping_details=shipping_details
+        )
+    except services.flash_sale.SoldOutError:
+        flash(request, "Sorry, an item in your cart sold out before checkout.", "warning")
+        return RedirectResponse(url="/customer/cart", status_code=303)
     
     # Clean up
     crud.clear_customer_cart(db, customer_id=current_user.id)
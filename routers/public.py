@@ -3,10 +3,14 @@
 from fastapi import APIRouter, Request, Depends
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, selectinload, undefer
+from typing import Optional
 from database import get_db
+from routers.cache_helpers import build_validators, cache_headers, is_not_modified, not_modified
 import crud
 import models
+import read_models
+import services.recommendation_service
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
@@ -14,11 +18,9 @@ templates = Jinja2Templates(directory="templates")
 @router.get("/", response_class=HTMLResponse)
 async def home(request: Request, db: Session = Depends(get_db)):
     # Fetch all data for our dynamic homepage using the new CRUD functions
-    trending_products = crud.get_trending_products(db, limit=8)
-    # The CRUD function returns a list of tuples, e.g., [('Pottery',), ('Woodwork',)]
-    # We need to extract the first item from each tuple.
-    categories = [category[0] for category in crud.get_all_categories(db) if category[0]]
-    top_artists = crud.get_all_artists(db, limit=8)
+    trending_products = read_models.get_trending_product_cards(db, limit=8)
+    categories = [category.name for category in crud.get_all_categories(db)]
+    top_artists = read_models.get_top_artist_cards(db, limit=8)
 
     user = request.session.get("user")
     context = {
@@ -35,31 +37,52 @@ async def home(request: Request, db: Session = Depends(get_db)):
 
 @router.get("/product/{product_id}", response_class=HTMLResponse)
 async def product_detail(request: Request, product_id: int, db: Session = Depends(get_db)):
+    version = crud.get_product_version(db, product_id=product_id)
+    if not version:
+        return HTMLResponse("Product not found", status_code=404)
+
+    # Answer revalidation before loading the product, its owner or rendering anything.
+    # The related items come from the in-memory index, so they cost no aggregation query here.
+    related_ids = services.recommendation_service.index.related(db, product_id)
+    etag, last_modified = build_validators(request, *version, tuple(related_ids), crud.get_products_last_change(db, related_ids))
+    headers = cache_headers(request, etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(headers)
+
     user = request.session.get("user")
     product = crud.get_product(db, product_id=product_id)
-    if not product:
-        return HTMLResponse("Product not found", status_code=404)
+    related_products = read_models.get_product_cards_by_ids(db, related_ids, in_stock_only=True)
         
     context = {
         "request": request,
         "user": user,
         "product": product,
+        "related_products": related_products,
         "currency": "INR",
         "conversion_rate": 83.0
     }
-    return templates.TemplateResponse("public/product_detail.html", context)
+    return templates.TemplateResponse("public/product_detail.html", context, headers=headers)
 
 
 @router.get("/category/{category_name}", response_class=HTMLResponse)
-async def view_category(request: Request, category_name: str, db: Session = Depends(get_db)):
-    products = crud.get_products_by_category(db, category_name=category_name)
+async def view_category(request: Request, category_name: str, price: Optional[str] = None, location: Optional[str] = None, in_stock: bool = False, db: Session = Depends(get_db)):
+    # Any spelling of the category resolves to the same normalized row.
+    category = crud.get_category_by_name(db, category_name)
+    price_band = price if price in crud.PRICE_BANDS else None
+    if category:
+        products = read_models.get_product_cards_by_category(db, category_id=category.id, price_band=price_band, location=location, in_stock_only=in_stock)
+        facets = crud.get_category_facets(db, category_id=category.id, price_band=price_band, location=location, in_stock_only=in_stock)
+    else:
+        products, facets = [], None
     user = request.session.get("user")
     
     context = {
         "request": request,
         "user": user,
         "products": products,
-        "category_name": category_name,
+        "category_name": category.name if category else category_name,
+        "facets": facets,
+        "selected": {"price": price_band, "location": location, "in_stock": in_stock},
         "currency": "INR",
         "conversion_rate": 83.0
     }
@@ -68,11 +91,22 @@ async def view_category(request: Request, category_name: str, db: Session = Depe
 
 @router.get("/artist/{artist_id}", response_class=HTMLResponse)
 async def view_artist_profile(request: Request, artist_id: int, db: Session = Depends(get_db)):
-    artist = db.query(models.User).filter(models.User.id == artist_id, models.User.role == models.UserRole.ARTIST).first()
-    if not artist:
+    version = crud.get_artist_version(db, artist_id=artist_id)
+    if not version:
         return HTMLResponse("Artist not found", status_code=404)
-    
-    products = crud.get_products_by_owner(db, owner_id=artist_id)
+
+    etag, last_modified = build_validators(request, *version)
+    headers = cache_headers(request, etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(headers)
+
+    artist = (
+        db.query(models.User)
+        .options(joinedload(models.User.stats), selectinload(models.User.skill_tags), undefer(models.User.bio))
+        .filter(models.User.id == artist_id, models.User.role == models.UserRole.ARTIST)
+        .first()
+    )
+    products = read_models.get_product_cards_by_owner(db, owner_id=artist_id)
     user = request.session.get("user")
     
     context = {
@@ -83,4 +117,4 @@ async def view_artist_profile(request: Request, artist_id: int, db: Session = De
         "currency": "INR",
         "conversion_rate": 83.0
     }
-    return templates.TemplateResponse("public/artist_profile.html", context)
\ No newline at end of file
+    return templates.TemplateResponse("public/artist_profile.html", context, headers=headers)
\ No newline at end of file
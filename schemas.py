@@ -1,5 +1,6 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import Dict, List, Optional
+from datetime import datetime
 from models import UserRole
 
 class UserCreate(BaseModel):
@@ -21,6 +22,90 @@ class ProductCreate(BaseModel):
     ai_generated_description: str
     image_filename: str
 
+class ProductImportRow(BaseModel):
+    """One row of a bulk catalog import. Description and price are filled in by the AI when left blank."""
+    name: str
+    category: str
+    artist_notes: str = ""
+    price_usd: Optional[float] = None
+    stock: int = 1
+    ai_generated_description: Optional[str] = None
+    image: str # File name inside the uploaded image archive
+
 class Token(BaseModel):
     access_token: str
-    token_type: str
\ No newline at end of file
+    token_type: str
+
+
+# --- JSON API (routers/api_v1.py) response models ---
+# Documentation of the response shapes (OpenAPI) and the field list that ?fields= is checked
+# against; responses are encoded directly and not validated against them.
+class ProductCardOut(BaseModel):
+    id: int
+    name: str
+    category: Optional[str]
+    price_usd: float
+    stock: int
+    image_filename: Optional[str]
+    owner_id: Optional[int]
+    owner_name: Optional[str]
+
+class ProductDetailOut(ProductCardOut):
+    description: Optional[str]
+    artist_notes: Optional[str]
+    flash_sale: bool
+    related_ids: List[int]
+
+class ArtistCardOut(BaseModel):
+    id: int
+    full_name: Optional[str]
+    studio_name: Optional[str]
+    profile_picture: Optional[str]
+    product_count: int
+    units_sold: int
+
+class CategoryOut(BaseModel):
+    slug: str
+    name: str
+    product_count: int
+    in_stock_count: int
+
+class HomeOut(BaseModel):
+    trending: List[ProductCardOut]
+    categories: List[CategoryOut]
+    top_artists: List[ArtistCardOut]
+
+class ProductPage(BaseModel):
+    """Keyset page: pass next_cursor back as ?cursor= for the next page; null on the last page."""
+    items: List[ProductCardOut]
+    next_cursor: Optional[int]
+    facets: Optional[Dict] = None
+
+class CartLineOut(BaseModel):
+    id: int
+    quantity: int
+    product: ProductCardOut
+
+class CartOut(BaseModel):
+    items: List[CartLineOut]
+    total_usd: float
+
+class CartItemIn(BaseModel):
+    product_id: int
+
+class OrderLineOut(BaseModel):
+    product_id: Optional[int]
+    product_name: Optional[str]
+    quantity: int
+    price_at_purchase_usd: float
+
+class OrderOut(BaseModel):
+    id: int
+    created_at: Optional[datetime]
+    status: Optional[str]
+    total_amount_usd: Optional[float]
+    items: List[OrderLineOut]
+
+class OrderPage(BaseModel):
+    items: List[OrderOut]
+    next_cursor: Optional[int]
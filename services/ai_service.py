@@ -1,21 +1,73 @@
 import google.generativeai as genai
 import os
+import re
 from dotenv import load_dotenv
+import time
+from typing import Iterator, Optional, Tuple
 
 load_dotenv()
 
-try:
-    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-    model = genai.GenerativeModel('gemini-2.5-flash')
-except Exception as e:
-    print(f"Error configuring Google AI: {e}")
-    model = None
+class FakeStreamingModel:
+    """
+    Stand-in for genai.GenerativeModel for offline development and demos (USE_FAKE_AI_MODEL=1).
+    Answers each prompt with canned text of the right shape (a description, a price range or a
+    justification) unless given fixed text; with stream=True it yields it in small chunks with an
+    optional delay per chunk. fail_after=N raises after N streamed chunks, to exercise error paths.
+    """
 
-def generate_product_description(name: str, category: str, artist_notes: str) -> str:
-    if not model:
-        return "AI service is not available. Please check API key."
-    
-    prompt = f"""
+    class _Chunk:
+        def __init__(self, text: str):
+            self.text = text
+
+    # (marker in the prompt, canned answer), first match wins; the last entry is the fallback.
+    CANNED_TEXTS = (
+        ("Suggested Price Range:", "Suggested Price Range: $40.00 - $60.00\n"
+                                   "Justification: A placeholder answer from the offline fake model."),
+        ("explain to the artist", "A placeholder justification from the offline fake model: "
+                                  "the materials and effort put this piece in the middle of the range."),
+        ("", "A placeholder description from the offline fake model.\n\n"
+             "Shaped by hand in a small studio, each piece carries the marks of its making."),
+    )
+
+    def __init__(self, text: str = None, chunk_size: int = 12, delay: float = 0.0, fail_after: int = None):
+        self.text = text
+        self.chunk_size = chunk_size
+        self.delay = delay
+        self.fail_after = fail_after
+
+    def text_for(self, prompt) -> str:
+        if self.text is not None:
+            return self.text
+        return next(answer for marker, answer in self.CANNED_TEXTS if marker in str(prompt))
+
+    def generate_content(self, prompt, stream: bool = False):
+        if not stream:
+            return self._Chunk(self.text_for(prompt))
+        return self._stream(self.text_for(prompt))
+
+    def _stream(self, text: str):
+        for count, start in enumerate(range(0, len(text), self.chunk_size)):
+            if self.fail_after is not None and count >= self.fail_after:
+                raise RuntimeError("fake model stream interrupted")
+            if self.delay:
+                time.sleep(self.delay)
+            yield self._Chunk(text[start:start + self.chunk_size])
+
+if os.getenv("USE_FAKE_AI_MODEL") == "1":
+    model = FakeStreamingModel()
+else:
+    try:
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        model = genai.GenerativeModel('gemini-2.5-flash')
+    except Exception as e:
+        print(f"Error configuring Google AI: {e}")
+        model = None
+
+class AIServiceError(Exception):
+    """Raised instead of returning an error string when the caller asks for raise_errors=True."""
+
+def _description_prompt(name: str, category: str, artist_notes: str) -> str:
+    return f"""
     You are an expert copywriter for an artisan marketplace called Artiflex. Your task is to write a compelling, evocative, and story-driven product description.
     
     Product Name: {name}
@@ -28,15 +80,44 @@ def generate_product_description(name: str, category: str, artist_notes: str) ->
     3. Connects with the customer on an emotional level.
     4. Is formatted beautifully for a web page using simple paragraphs.
     """
+
+def generate_product_description(name: str, category: str, artist_notes: str, raise_errors: bool = False) -> str:
+    if not model:
+        if raise_errors:
+            raise AIServiceError("AI service is not available. Please check API key.")
+        return "AI service is not available. Please check API key."
+    
+    prompt = _description_prompt(name, category, artist_notes)
     try:
         response = model.generate_content(prompt)
         return response.text
     except Exception as e:
+        if raise_errors:
+            raise AIServiceError(f"Error generating description: {e}") from e
         return f"Error generating description: {e}"
 
 
-def suggest_product_price(name: str, category: str, artist_notes: str) -> str:
+def stream_product_description(name: str, category: str, artist_notes: str, streaming_model=None) -> Iterator[str]:
+    """
+    Yields the description text chunk by chunk as the model produces it.
+    Blocking (the Gemini client is synchronous), so iterate it from a thread — StreamingResponse does.
+    Raises AIServiceError if the model is unavailable or the stream fails part-way.
+    """
+    streaming_model = streaming_model or model
+    if not streaming_model:
+        raise AIServiceError("AI service is not available. Please check API key.")
+    try:
+        for chunk in streaming_model.generate_content(_description_prompt(name, category, artist_notes), stream=True):
+            if chunk.text:
+                yield chunk.text
+    except Exception as e:
+        raise AIServiceError(f"Error generating description: {e}") from e
+
+
+def suggest_product_price(name: str, category: str, artist_notes: str, raise_errors: bool = False) -> str:
     if not model:
+        if raise_errors:
+            raise AIServiceError("AI service is not available.")
         return "AI service is not available."
 
     prompt = f"""
@@ -55,4 +136,48 @@ def suggest_product_price(name: str, category: str, artist_notes: str) -> str:
         response = model.generate_content(prompt)
         return response.text
     except Exception as e:
-        return f"Error suggesting price: {e}"
\ No newline at end of file
+        if raise_errors:
+            raise AIServiceError(f"Error suggesting price: {e}") from e
+        return f"Error suggesting price: {e}"
+
+
+def explain_price_suggestion(name: str, category: str, artist_notes: str, low: float, high: float, median: float, sell_through: float, raise_errors: bool = False) -> str:
+    """
+    A one-paragraph justification for a price range computed by services.pricing_service.
+    The model only explains the figures; it does not choose the price.
+    """
+    if not model:
+        if raise_errors:
+            raise AIServiceError("AI service is not available.")
+        return "AI service is not available."
+
+    prompt = f"""
+    You are an e-commerce pricing consultant specializing in handcrafted goods.
+
+    Product Name: {name}
+    Category: {category}
+    Artist's Notes on materials and effort: {artist_notes}
+
+    Based on recent sales on our marketplace, similar items sell for ${low:.2f} - ${high:.2f}
+    (typical price ${median:.2f}; {sell_through:.0%} of listed units in this category have sold).
+    In one short paragraph, explain to the artist where in this range their product should sit and why,
+    based on its materials and effort. Do not suggest a price outside the range.
+    """
+    try:
+        response = model.generate_content(prompt)
+        return response.text
+    except Exception as e:
+        if raise_errors:
+            raise AIServiceError(f"Error explaining price: {e}") from e
+        return f"Error explaining price: {e}"
+
+
+_PRICE_RANGE_RE = re.compile(r"\$\s*([\d,]+(?:\.\d+)?)\s*-\s*\$?\s*([\d,]+(?:\.\d+)?)")
+
+def parse_price_range(suggestion: str) -> Optional[Tuple[float, float]]:
+    """Extracts (low, high) from a 'Suggested Price Range: $XX.XX - $YY.YY' line, or None."""
+    match = _PRICE_RANGE_RE.search(suggestion or "")
+    if not match:
+        return None
+    low, high = (float(group.replace(",", "")) for group in match.groups())
+    return min(low, high), max(low, high)
\ No newline at end of file
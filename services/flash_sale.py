@@ -0,0 +1,354 @@
+"""
+Flash-sale mode for hot products.
+
+For products flagged with Product.flash_sale, stock admission happens in memory instead of on the
+products row: add-to-cart takes a time-limited reservation from an in-process counter, checkout
+turns the reservation into a sale, and the units sold are subtracted from products.stock later in
+batched transactions by a background flusher.
+
+Correctness rests on two rules:
+- The in-memory `available` count never exceeds the units really left, so admission cannot oversell.
+- The database stays the source of truth for sales. The flusher subtracts the quantities of
+  order_items newer than Product.flash_sale_watermark and advances the watermark in the same
+  transaction, so a crash can never lose or double-count a sale.
+
+Reservations are the only state that lives purely in memory. They are appended to a reservation log
+(FLASH_SALE_LOG) and replayed on startup. A lost log record can only make stock look scarcer
+until it expires. It can never make stock look more plentiful than it is.
+
+Switching a product in or out of flash-sale mode decides which of two paths its sales take (the
+write-behind above, or crud.create_order's direct decrement). The switch and checkout are serialized
+by `mode_lock`: create_order claims flash-sale units (begin_checkout), picks each line's path with
+is_hot() and commits the lines while holding it, so every sale is admitted and counted by one path.
+
+The counters are per process, so flash-sale mode assumes a single app worker process.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import crud
+import models
+from database import SessionLocal
+
+logger = logging.getLogger("artiflex.flash_sale")
+
+FLASH_SALE_LOG = os.getenv("FLASH_SALE_LOG", "flash_sale_reservations.log")
+FLASH_SALE_RESERVATION_SECONDS = int(os.getenv("FLASH_SALE_RESERVATION_SECONDS", "600"))
+FLASH_SALE_FLUSH_INTERVAL = float(os.getenv("FLASH_SALE_FLUSH_INTERVAL", "1.0"))
+
+
+class SoldOutError(Exception):
+    """Raised by crud.create_order when a flash-sale item in the order has no units left."""
+
+
+class _HotProduct:
+    __slots__ = ("product_id", "available", "reservations", "lock")
+
+    def __init__(self, product_id: int, available: int):
+        self.product_id = product_id
+        self.available = available
+        self.reservations: Dict[int, Tuple[int, float]] = {} # customer_id -> (quantity, expires_at)
+        self.lock = threading.Lock()
+
+    def expire(self, now: float) -> List[int]:
+        """Returns expired reservations to the pool (caller holds the lock). Returns affected customers."""
+        expired = [customer_id for customer_id, (_, expires_at) in self.reservations.items() if expires_at <= now]
+        for customer_id in expired:
+            self.available += self.reservations.pop(customer_id)[0]
+        return expired
+
+
+class FlashSaleManager:
+    def __init__(self, log_path: str = FLASH_SALE_LOG, reservation_seconds: int = FLASH_SALE_RESERVATION_SECONDS):
+        self.log_path = log_path
+        self.reservation_seconds = reservation_seconds
+        self._hot: Dict[int, _HotProduct] = {}
+        self._log_lock = threading.Lock()
+        self._log_file = None
+        self._flush_lock = threading.Lock()
+        # Held by crud.create_order from claiming units to committing lines, and by enable()/disable() while they switch modes.
+        self.mode_lock = threading.Lock()
+        self._stopping = False
+
+    # --- Reservation log ---
+    def _log(self, op: str, customer_id: int, product_id: int, quantity: int = 0, expires_at: float = 0.0):
+        record = json.dumps({"op": op, "c": customer_id, "p": product_id, "q": quantity, "exp": expires_at})
+        with self._log_lock:
+            if self._log_file is None:
+                self._log_file = open(self.log_path, "a", buffering=1)
+            self._log_file.write(record + "\n")
+
+    def _replay_log(self) -> Dict[Tuple[int, int], Tuple[int, float]]:
+        """Rebuilds {(customer_id, product_id): (quantity, expires_at)} from the log."""
+        holds = {}
+        if not os.path.exists(self.log_path):
+            return holds
+        with open(self.log_path) as log_file:
+            for line in log_file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue # Torn last line after a crash
+                key = (record["c"], record["p"])
+                if record["op"] == "hold":
+                    holds[key] = (record["q"], record["exp"])
+                else:
+                    holds.pop(key, None)
+        return holds
+
+    def _compact_log(self):
+        """Rewrites the log with only the live reservations so it does not grow without bound."""
+        with self._log_lock:
+            if self._log_file is not None:
+                self._log_file.close()
+                self._log_file = None
+            tmp_path = self.log_path + ".tmp"
+            with open(tmp_path, "w") as log_file:
+                for hot in self._hot.values():
+                    for customer_id, (quantity, expires_at) in hot.reservations.items():
+                        log_file.write(json.dumps({"op": "hold", "c": customer_id, "p": hot.product_id, "q": quantity, "exp": expires_at}) + "\n")
+            os.replace(tmp_path, self.log_path)
+
+    # --- Loading and mode switching ---
+    @staticmethod
+    def _unflushed_sales(db: Session, product: models.Product) -> Tuple[int, Optional[int]]:
+        """Units sold since the watermark and the newest order_items.id among them."""
+        sold, last_item_id = (
+            db.query(func.coalesce(func.sum(models.OrderItem.quantity), 0), func.max(models.OrderItem.id))
+            .filter(models.OrderItem.product_id == product.id, models.OrderItem.id > (product.flash_sale_watermark or 0))
+            .one()
+        )
+        return int(sold), last_item_id
+
+    def load(self, db: Session):
+        """Rebuilds the in-memory counters after a (re)start: stock from the DB, reservations from the log."""
+        self._hot = {}
+        for product in db.query(models.Product).filter(models.Product.flash_sale.is_(True)):
+            sold, _ = self._unflushed_sales(db, product)
+            self._hot[product.id] = _HotProduct(product.id, max(0, (product.stock or 0) - sold))
+        now = time.time()
+        # Replay newest-expiring first so that, if stock shrank, the oldest reservations are the ones dropped.
+        for (customer_id, product_id), (quantity, expires_at) in sorted(self._replay_log().items(), key=lambda item: -item[1][1]):
+            hot = self._hot.get(product_id)
+            if hot is None or expires_at <= now or quantity > hot.available:
+                continue
+            hot.available -= quantity
+            hot.reservations[customer_id] = (quantity, expires_at)
+        self._compact_log()
+
+    def is_hot(self, product_id: int) -> bool:
+        return product_id in self._hot
+
+    def available(self, product_id: int) -> Optional[int]:
+        hot = self._hot.get(product_id)
+        return hot.available if hot else None
+
+    def enable(self, db: Session, product: models.Product):
+        """
+        Puts a product into flash-sale mode. Earlier orders were already subtracted from stock by
+        crud.create_order, so the watermark starts at the newest existing order line. The counter is
+        in place before the flag is committed, and no order lines are written in between.
+        """
+        with self.mode_lock:
+            db.refresh(product)
+            if product.flash_sale or product.id in self._hot:
+                return
+            hot = _HotProduct(product.id, max(0, product.stock or 0))
+            with hot.lock:
+                self._hot[product.id] = hot
+                try:
+                    product.flash_sale_watermark = (
+                        db.query(func.coalesce(func.max(models.OrderItem.id), 0)).filter(models.OrderItem.product_id == product.id).scalar()
+                    )
+                    product.flash_sale = True
+                    db.commit()
+                except Exception:
+                    db.rollback()
+                    self._hot.pop(product.id, None)
+                    raise
+
+    def disable(self, db: Session, product: models.Product):
+        """
+        Folds outstanding sales into stock and returns the product to normal mode, in one transaction
+        and with no order lines written in between. Open reservations lapse.
+        """
+        with self.mode_lock:
+            db.refresh(product)
+            if not product.flash_sale:
+                self.forget(product.id)
+                return
+            hot = self._hot.get(product.id)
+            with self._flush_lock:
+                if hot is not None:
+                    hot.lock.acquire()
+                try:
+                    self._flush(db, [product.id], commit=False)
+                    product.flash_sale = False
+                    db.commit()
+                    self.forget(product.id)
+                except Exception:
+                    db.rollback()
+                    raise
+                finally:
+                    if hot is not None:
+                        hot.lock.release()
+
+    def forget(self, product_id: int):
+        """Drops the counters of a deleted product."""
+        hot = self._hot.pop(product_id, None)
+        if hot:
+            for customer_id in list(hot.reservations):
+                self._log("drop", customer_id, product_id)
+
+    # --- Admission ---
+    def reserve(self, customer_id: int, product_id: int, quantity: int = 1) -> bool:
+        """Adds quantity to the customer's reservation and renews its expiry. False if sold out."""
+        hot = self._hot.get(product_id)
+        if hot is None:
+            return False
+        now = time.time()
+        with hot.lock:
+            hot.expire(now)
+            if hot.available < quantity:
+                return False
+            hot.available -= quantity
+            held, _ = hot.reservations.get(customer_id, (0, 0.0))
+            expires_at = now + self.reservation_seconds
+            hot.reservations[customer_id] = (held + quantity, expires_at)
+        self._log("hold", customer_id, product_id, held + quantity, expires_at)
+        return True
+
+    def release(self, customer_id: int, product_id: int):
+        """Returns the customer's whole reservation for this product to the pool (item removed from cart)."""
+        hot = self._hot.get(product_id)
+        if hot is None:
+            return
+        with hot.lock:
+            quantity, _ = hot.reservations.pop(customer_id, (0, 0.0))
+            hot.available += quantity
+        if quantity:
+            self._log("drop", customer_id, product_id)
+
+    def begin_checkout(self, customer_id: int, items: List[Tuple[int, int]]):
+        """
+        Atomically claims units for every hot (product_id, quantity) in the order: first from the
+        customer's reservation, the rest (e.g. after it expired) from what is still available.
+        Called by crud.create_order under mode_lock, so the set of hot products cannot change before
+        the order lines are written.
+        Returns a hold to pass to confirm_checkout/abort_checkout, or None if anything is sold out.
+        """
+        wanted = {}
+        for product_id, quantity in items:
+            if product_id in self._hot:
+                wanted[product_id] = wanted.get(product_id, 0) + quantity
+        hots = [self._hot[product_id] for product_id in sorted(wanted)] # Fixed lock order: no deadlocks
+        for hot in hots:
+            hot.lock.acquire()
+        try:
+            now = time.time()
+            for hot in hots:
+                hot.expire(now)
+            for hot in hots:
+                held, _ = hot.reservations.get(customer_id, (0, 0.0))
+                if held + hot.available < wanted[hot.product_id]:
+                    return None
+            hold = {}
+            for hot in hots:
+                previous = hot.reservations.pop(customer_id, None)
+                held = previous[0] if previous else 0
+                # Surplus reservation goes back to the pool; a shortfall comes out of it.
+                hot.available += held - wanted[hot.product_id]
+                hold[hot.product_id] = (wanted[hot.product_id], previous)
+            return hold
+        finally:
+            for hot in hots:
+                hot.lock.release()
+
+    def confirm_checkout(self, customer_id: int, hold: dict):
+        """The order is committed: its order_items now carry the sale, so the reservations are gone for good."""
+        for product_id in hold:
+            self._log("drop", customer_id, product_id)
+
+    def abort_checkout(self, customer_id: int, hold: dict):
+        """The order was not created: give the units back and restore the customer's reservations."""
+        for product_id, (quantity, previous) in hold.items():
+            hot = self._hot.get(product_id)
+            if hot is None:
+                continue
+            with hot.lock:
+                hot.available += quantity
+                if previous:
+                    hot.available -= previous[0]
+                    hot.reservations[customer_id] = previous
+
+    # --- Write-behind ---
+    def flush(self, db: Session, product_ids: Optional[List[int]] = None) -> int:
+        """
+        Subtracts the units sold since each hot product's watermark from products.stock and advances
+        the watermark, for all products in one transaction. Returns the number of units folded in.
+        """
+        ids = product_ids if product_ids is not None else list(self._hot)
+        if not ids:
+            return 0
+        with self._flush_lock:
+            return self._flush(db, ids)
+
+    def _flush(self, db: Session, ids: List[int], commit: bool = True) -> int:
+        total = 0
+        for product in db.query(models.Product).filter(models.Product.id.in_(ids), models.Product.flash_sale.is_(True)):
+            sold, last_item_id = self._unflushed_sales(db, product)
+            if not sold:
+                continue
+            was_in_stock = (product.stock or 0) > 0
+            product.stock = (product.stock or 0) - sold
+            product.flash_sale_watermark = last_item_id
+            if was_in_stock and product.stock <= 0:
+                crud.adjust_category_counts(db, product.category_id, in_stock=-1)
+                crud.adjust_artist_stats(db, product.owner_id, in_stock=-1)
+            total += sold
+        if commit:
+            db.commit()
+        return total
+
+    def sweep_expired(self):
+        now = time.time()
+        for hot in list(self._hot.values()):
+            with hot.lock:
+                expired = hot.expire(now)
+            for customer_id in expired:
+                self._log("drop", customer_id, hot.product_id)
+
+    def _flush_once(self):
+        db = SessionLocal()
+        try:
+            self.flush(db)
+        finally:
+            db.close()
+
+    async def run(self):
+        """Background flusher started from the app lifespan."""
+        self._stopping = False
+        while not self._stopping:
+            try:
+                self.sweep_expired()
+                await asyncio.to_thread(self._flush_once)
+            except Exception:
+                logger.exception("Flash-sale flush failed")
+            await asyncio.sleep(FLASH_SALE_FLUSH_INTERVAL)
+
+    async def stop(self):
+        """Final flush and log compaction on shutdown; the caller cancels the run() task."""
+        self._stopping = True
+        await asyncio.to_thread(self._flush_once)
+        self._compact_log()
+
+manager = FlashSaleManager()
@@ -0,0 +1,349 @@
+"""
+Bulk catalog import for artists.
+
+An upload is staged in a worker thread of the upload request (the rows file is streamed, each row
+validated and stored as an ImportRow, the images it references extracted from the archive), then a
+queued "bulk_import" job fills in missing prices from the local pricing engine, enriches rows that
+lack a description (or a price, while the marketplace has no data) through a concurrency- and
+rate-limited pool of AI calls and inserts the products in batched transactions. Each batch commits
+its products together with the matching ImportRow status, so a crashed or failed job can be
+resumed without redoing finished rows.
+"""
+
+import asyncio
+import csv
+import io
+import json
+import os
+import shutil
+import time
+import zipfile
+from typing import Dict, Iterator, Optional, Tuple
+
+from pydantic import ValidationError
+
+import crud
+import models
+import schemas
+import services.ai_service
+import services.pricing_service
+from database import SessionLocal
+from services.job_queue import job_handler
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "50"))
+IMPORT_MAX_ARCHIVE_MEMBERS = int(os.getenv("IMPORT_MAX_ARCHIVE_MEMBERS", "5000"))
+IMPORT_MAX_IMAGE_BYTES = int(os.getenv("IMPORT_MAX_IMAGE_BYTES", str(20 * 2**20)))
+IMPORT_MAX_EXTRACTED_BYTES = int(os.getenv("IMPORT_MAX_EXTRACTED_BYTES", str(1024 * 2**20)))
+AI_IMPORT_CONCURRENCY = int(os.getenv("AI_IMPORT_CONCURRENCY", "4"))
+AI_IMPORT_REQUESTS_PER_MINUTE = int(os.getenv("AI_IMPORT_REQUESTS_PER_MINUTE", "60"))
+IMPORT_JOB_CONCURRENCY = int(os.getenv("IMPORT_JOB_CONCURRENCY", "4")) # Imports of different artists run side by side
+
+UPLOAD_DIR = "static/uploads"
+IMAGE_EXTENSIONS = {"jpg", "jpeg", "png", "gif", "webp"}
+
+# Jobs currently being processed by this worker, so a resume cannot start a second runner.
+_running_jobs = set()
+
+# AI limits shared by every import running on the loop, so parallel imports do not multiply them.
+_ai_limits: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore, "RateLimiter"]] = None
+
+
+class RateLimiter:
+    """Spaces out calls so that no more than `per_minute` start in any minute."""
+
+    def __init__(self, per_minute: int):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+def _shared_ai_limits() -> Tuple[asyncio.Semaphore, RateLimiter]:
+    global _ai_limits
+    loop = asyncio.get_running_loop()
+    if _ai_limits is None or _ai_limits[0] is not loop:
+        _ai_limits = (loop, asyncio.Semaphore(AI_IMPORT_CONCURRENCY), RateLimiter(AI_IMPORT_REQUESTS_PER_MINUTE))
+    return _ai_limits[1], _ai_limits[2]
+
+
+# --- Staging (runs inside the upload request, in a worker thread) ---
+class ImportFileError(Exception):
+    """An uploaded file cannot be used at all; nothing is staged."""
+
+class ImportArchiveError(ImportFileError):
+    """The image archive cannot be used at all (not a zip, or too many members)."""
+
+def check_rows_file(rows_file, filename: str):
+    """
+    Reads the whole rows file once, before anything is staged, so that an undecodable or malformed
+    file is rejected up front instead of failing half-way and leaving an empty job behind.
+    Bad individual rows are fine; they are staged as INVALID. Raises ImportFileError.
+    """
+    try:
+        for _ in iter_rows(rows_file, filename):
+            pass
+    except UnicodeDecodeError as e:
+        raise ImportFileError(f"The rows file is not UTF-8 text (byte {e.start}). Please save it as UTF-8 and upload it again.") from e
+    except csv.Error as e:
+        raise ImportFileError(f"The rows file could not be read as CSV: {e}.") from e
+    finally:
+        rows_file.seek(0)
+
+def _safe_name(value: str) -> str:
+    return "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in value)[:60]
+
+class ImageArchive:
+    """
+    Lazily extracts the images of a zip archive into the uploads folder, one member at a time and
+    only when a row asks for it, so images no row references are never written. The member count,
+    the size of each image and the total extracted size are capped (zip bombs).
+    Member paths are never used on disk, so archives cannot write outside the uploads folder.
+    """
+
+    def __init__(self, archive_file):
+        try:
+            self._archive = zipfile.ZipFile(archive_file)
+        except zipfile.BadZipFile as e:
+            raise ImportArchiveError("The images file is not a valid zip archive.") from e
+        members = self._archive.infolist()
+        if len(members) > IMPORT_MAX_ARCHIVE_MEMBERS:
+            self._archive.close()
+            raise ImportArchiveError(f"The archive has {len(members)} files; the limit is {IMPORT_MAX_ARCHIVE_MEMBERS}.")
+        # Base name (as referenced by the rows file) -> member; the last one wins, as before.
+        self._members: Dict[str, zipfile.ZipInfo] = {}
+        for member in members:
+            base_name = os.path.basename(member.filename)
+            stem, _, extension = base_name.rpartition(".")
+            if not member.is_dir() and stem and extension.lower() in IMAGE_EXTENSIONS:
+                self._members[base_name] = member
+        self._saved: Dict[str, str] = {}
+        self._extracted_bytes = 0
+        self._timestamp = int(time.time())
+
+    def extract(self, name: str) -> Tuple[Optional[str], Optional[str]]:
+        """(saved image file name, None), or (None, reason) if the image is missing or over a limit."""
+        base_name = os.path.basename(name)
+        if base_name in self._saved:
+            return self._saved[base_name], None
+        member = self._members.get(base_name)
+        if member is None:
+            return None, f"Image '{name}' was not found in the archive."
+        if member.file_size > IMPORT_MAX_IMAGE_BYTES:
+            return None, f"Image '{name}' is larger than {IMPORT_MAX_IMAGE_BYTES / 2**20:g} MB."
+        if self._extracted_bytes + member.file_size > IMPORT_MAX_EXTRACTED_BYTES:
+            return None, f"Image '{name}' would exceed the {IMPORT_MAX_EXTRACTED_BYTES / 2**20:g} MB limit for one import."
+        stem, _, extension = base_name.rpartition(".")
+        image_filename = f"product_{self._timestamp}_{len(self._saved)}_{_safe_name(stem)}.{extension.lower()}"
+        # ZipExtFile stops at the declared file_size, so the checks above bound what is written.
+        with self._archive.open(member) as source, open(os.path.join(UPLOAD_DIR, image_filename), "wb") as target:
+            shutil.copyfileobj(source, target)
+        self._extracted_bytes += member.file_size
+        self._saved[base_name] = image_filename
+        return image_filename, None
+
+    def close(self):
+        self._archive.close()
+
+def iter_rows(rows_file, filename: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """
+    Streams (row_number, data, error) from a CSV or JSONL upload without reading it all into memory.
+    Empty CSV cells are dropped so that optional fields fall back to their defaults.
+    """
+    text = io.TextIOWrapper(rows_file, encoding="utf-8-sig", newline="")
+    try:
+        if filename.lower().endswith((".jsonl", ".ndjson")):
+            for row_number, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield row_number, None, f"Invalid JSON: {e}"
+                    continue
+                if not isinstance(data, dict):
+                    yield row_number, None, "Each line must be a JSON object."
+                    continue
+                yield row_number, data, None
+        else:
+            for row_number, data in enumerate(csv.DictReader(text), start=1):
+                yield row_number, {k.strip(): v for k, v in data.items() if k and v not in (None, "")}, None
+    finally:
+        text.detach()
+
+def stage_import(db, owner_id: int, rows_file, filename: str, archive_file=None) -> models.ImportJob:
+    """
+    Creates an ImportJob and one ImportRow per uploaded row, committing every IMPORT_BATCH_SIZE rows.
+    Rows that fail validation are stored as INVALID with the reason and are never retried.
+    Blocking (file I/O and commits): call it from a worker thread. Raises ImportFileError.
+    """
+    check_rows_file(rows_file, filename)
+    images = ImageArchive(archive_file) if archive_file else None
+    try:
+        return _stage_rows(db, owner_id, rows_file, filename, images)
+    finally:
+        if images is not None:
+            images.close()
+
+def _stage_rows(db, owner_id: int, rows_file, filename: str, images: Optional[ImageArchive]) -> models.ImportJob:
+    job = crud.create_import_job(db, owner_id=owner_id, source_filename=filename)
+
+    batch = []
+    for row_number, data, error in iter_rows(rows_file, filename):
+        payload = None
+        if error is None:
+            try:
+                row = schemas.ProductImportRow(**data)
+                if images is None:
+                    image_filename, error = None, f"Image '{row.image}' was not found in the archive."
+                else:
+                    image_filename, error = images.extract(row.image)
+                if error is None:
+                    payload = json.dumps({**row.model_dump(), "image_filename": image_filename})
+            except ValidationError as e:
+                error = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+        batch.append(models.ImportRow(
+            job_id=job.id, row_number=row_number, payload=payload, error=error,
+            status=models.ImportRowStatus.INVALID if error else models.ImportRowStatus.PENDING,
+        ))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            db.add_all(batch)
+            db.commit()
+            batch = []
+    if batch:
+        db.add_all(batch)
+        db.flush() # Sessions do not autoflush; the counts below must see the last batch
+    crud.refresh_import_job_counts(db, job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+# --- Processing (runs in the background) ---
+async def _call_ai(semaphore: asyncio.Semaphore, limiter: RateLimiter, func, **kwargs) -> str:
+    async with semaphore:
+        await limiter.acquire()
+        return await asyncio.to_thread(func, raise_errors=True, **kwargs)
+
+async def _enrich(row: dict, semaphore: asyncio.Semaphore, limiter: RateLimiter) -> schemas.ProductCreate:
+    """Fills in a missing description and/or price, running both AI calls for the row concurrently."""
+    prompt_args = {"name": row["name"], "category": row["category"], "artist_notes": row["artist_notes"]}
+    description_call = price_call = None
+    if not row.get("ai_generated_description"):
+        description_call = _call_ai(semaphore, limiter, services.ai_service.generate_product_description, **prompt_args)
+    if row.get("price_usd") is None:
+        price_call = _call_ai(semaphore, limiter, services.ai_service.suggest_product_price, **prompt_args)
+    pending = [call for call in (description_call, price_call) if call is not None]
+    results = iter(await asyncio.gather(*pending))
+
+    description = next(results) if description_call else row["ai_generated_description"]
+    price = row.get("price_usd")
+    if price_call:
+        price_range = services.ai_service.parse_price_range(next(results))
+        if price_range is None:
+            raise services.ai_service.AIServiceError("Could not read a price range from the AI suggestion.")
+        price = round(sum(price_range) / 2, 2)
+
+    return schemas.ProductCreate(
+        name=row["name"], category=row["category"], artist_notes=row["artist_notes"],
+        price_usd=price, stock=row["stock"], ai_generated_description=description,
+        image_filename=row["image_filename"],
+    )
+
+def _start_job(db, job_id: int) -> Optional[models.ImportJob]:
+    job = db.get(models.ImportJob, job_id)
+    if job is not None:
+        job.status = models.ImportJobStatus.RUNNING
+        db.commit()
+    return job
+
+def _next_batch(db, job_id: int, after_id: int):
+    """The next unfinished rows and their payloads, with missing prices filled in from the local pricing engine."""
+    rows = crud.get_unfinished_import_rows(db, job_id, after_id=after_id, limit=IMPORT_BATCH_SIZE)
+    payloads = [json.loads(row.payload) for row in rows]
+    for payload in payloads:
+        # The AI is only asked for a price if the marketplace has no data yet.
+        if payload.get("price_usd") is None:
+            suggestion = services.pricing_service.engine.suggest(db, payload["category"], build_if_missing=True)
+            if suggestion is not None:
+                payload["price_usd"] = suggestion.suggested
+    return rows, payloads
+
+def _commit_batch(db, job: models.ImportJob, rows, results):
+    """One transaction per batch: products and their row statuses commit (or roll back) together."""
+    succeeded = [(row, result) for row, result in zip(rows, results) if not isinstance(result, Exception)]
+    products = crud.add_products(db, owner_id=job.owner_id, products=[result for _, result in succeeded])
+    for (row, _), product in zip(succeeded, products):
+        row.status = models.ImportRowStatus.DONE
+        row.product_id = product.id
+        row.error = None
+    for row, result in zip(rows, results):
+        if isinstance(result, Exception):
+            row.status = models.ImportRowStatus.FAILED
+            row.error = str(result)
+    crud.refresh_import_job_counts(db, job)
+    db.commit()
+
+def _finish_job(db, job: models.ImportJob):
+    crud.refresh_import_job_counts(db, job)
+    if job.failed_rows or job.invalid_rows:
+        job.status = models.ImportJobStatus.COMPLETED_WITH_ERRORS
+    else:
+        job.status = models.ImportJobStatus.COMPLETED
+    db.commit()
+
+def _fail_job(db, job_id: int):
+    db.rollback()
+    job = db.get(models.ImportJob, job_id)
+    if job is not None:
+        job.status = models.ImportJobStatus.FAILED
+        db.commit()
+
+async def run_import_job(job_id: int):
+    """
+    Processes every pending or previously failed row of a job. Safe to call again to resume.
+    The AI calls run on the event loop; every DB step runs in a worker thread, one at a time, so the
+    session is never used from two threads at once.
+    """
+    if job_id in _running_jobs:
+        return
+    _running_jobs.add(job_id)
+    db = SessionLocal()
+    semaphore, limiter = _shared_ai_limits()
+    try:
+        job = await asyncio.to_thread(_start_job, db, job_id)
+        if job is None:
+            return
+
+        last_id = 0
+        while True:
+            rows, payloads = await asyncio.to_thread(_next_batch, db, job_id, last_id)
+            if not rows:
+                break
+            last_id = rows[-1].id
+            results = await asyncio.gather(
+                *(_enrich(payload, semaphore, limiter) for payload in payloads),
+                return_exceptions=True,
+            )
+            await asyncio.to_thread(_commit_batch, db, job, rows, results)
+
+        await asyncio.to_thread(_finish_job, db, job)
+    except Exception:
+        await asyncio.to_thread(_fail_job, db, job_id)
+        raise
+    finally:
+        db.close()
+        _running_jobs.discard(job_id)
+
+@job_handler("bulk_import", concurrency=IMPORT_JOB_CONCURRENCY, max_attempts=3, key=lambda payload: payload.get("owner_id"))
+async def bulk_import_job(payload: dict):
+    # Re-running is safe: only rows that are not DONE are processed. One import per artist at a time.
+    await run_import_job(payload["job_id"])
+
+def is_running(job_id: int) -> bool:
+    return job_id in _running_jobs
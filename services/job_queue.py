@@ -0,0 +1,368 @@
+"""
+Durable in-process background job queue.
+
+Jobs are rows in the `jobs` table, so they survive restarts. Request handlers call enqueue(),
+usually in the same transaction as the write that caused the work, and an asyncio worker started
+from the app lifespan (main.py) claims and runs them:
+
+- at-least-once: a job is marked DONE only after its handler returns. While it runs, a heartbeat
+  renews its lease; jobs whose lease expired (worker crashed mid-run) are put back in the queue,
+  so handlers must be idempotent.
+- retries: a failing job is retried with exponential backoff until max_attempts, then marked DEAD.
+- priorities: higher `priority` runs first; ties run in enqueue order.
+- per-type concurrency: each job type declares how many of its jobs may run at once, and
+  optionally a key (e.g. the owner) of which only one job may run at a time.
+- retention: the worker deletes DONE jobs after JOB_RETENTION_DAYS and DEAD ones after
+  JOB_DEAD_RETENTION_DAYS, so the table does not grow with every order.
+
+Handlers are registered with @job_handler("type") and receive the JSON payload as a dict.
+Sync handlers run in a worker thread; async handlers run on the event loop. The worker's own
+database work (claiming, finishing, lease upkeep) runs in worker threads.
+"""
+
+import asyncio
+import inspect
+import json
+import logging
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+
+logger = logging.getLogger("artiflex.jobs")
+
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "600"))
+JOB_HEARTBEAT_SECONDS = JOB_LEASE_SECONDS / 4
+JOB_BACKOFF_BASE = float(os.getenv("JOB_BACKOFF_BASE", "2.0"))
+JOB_BACKOFF_MAX = float(os.getenv("JOB_BACKOFF_MAX", "600"))
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "7"))
+JOB_DEAD_RETENTION_DAYS = float(os.getenv("JOB_DEAD_RETENTION_DAYS", "30"))
+JOB_PURGE_INTERVAL = float(os.getenv("JOB_PURGE_INTERVAL", "3600"))
+JOB_PURGE_BATCH = 5000 # Rows per DELETE, so the write lock is never held for long
+
+
+class _Handler:
+    def __init__(self, func: Callable, concurrency: int, max_attempts: int, key: Optional[Callable[[dict], object]]):
+        self.func = func
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.key = key
+        self.is_async = inspect.iscoroutinefunction(func)
+
+_handlers: Dict[str, _Handler] = {}
+
+def job_handler(job_type: str, concurrency: int = 1, max_attempts: int = 5, key: Optional[Callable[[dict], object]] = None):
+    """
+    Registers the decorated function as the handler for job_type.
+    Args:
+        concurrency → How many jobs of this type may run at once.
+        key → Maps a payload to a key; jobs with the same (non-None) key never run at the same time.
+    """
+    def decorator(func):
+        _handlers[job_type] = _Handler(func, concurrency, max_attempts, key)
+        return func
+    return decorator
+
+
+def enqueue(db: Session, job_type: str, payload: Optional[dict] = None, priority: int = 0, delay_seconds: float = 0, unique: bool = False, commit: bool = False):
+    """
+    Adds a job to the caller's session. Without commit=True it is persisted by the caller's own
+    commit, i.e. atomically with the write that made it necessary.
+    Args:
+        unique → Skip if an identical job (same type and payload) is already queued.
+    Returns:
+        The Job, or None if skipped as a duplicate.
+    """
+    encoded = json.dumps(payload or {}, sort_keys=True)
+    if unique:
+        exists = db.query(models.Job.id).filter(
+            models.Job.job_type == job_type, models.Job.payload == encoded, models.Job.status == models.JobStatus.QUEUED
+        ).first()
+        if exists:
+            return None
+    handler = _handlers.get(job_type)
+    job = models.Job(
+        job_type=job_type, payload=encoded, priority=priority,
+        max_attempts=handler.max_attempts if handler else 5,
+        run_after=datetime.utcnow() + timedelta(seconds=delay_seconds),
+    )
+    db.add(job)
+    if commit:
+        db.commit()
+    worker.wake()
+    return job
+
+def backoff_seconds(attempts: int) -> float:
+    """Exponential backoff with full jitter: up to base * 2^(attempts-1), capped at JOB_BACKOFF_MAX."""
+    return random.uniform(0, min(JOB_BACKOFF_MAX, JOB_BACKOFF_BASE * 2 ** max(attempts - 1, 0)))
+
+
+class JobWorker:
+    def __init__(self):
+        self._running: Dict[str, int] = {}
+        self._running_keys: Set[Tuple[str, object]] = set()
+        self._tasks = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping = False
+
+    def wake(self):
+        """Lets the worker pick up a freshly enqueued job without waiting for the next poll."""
+        if self._loop is not None and self._wakeup is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+            except RuntimeError:
+                pass # Loop already closed
+
+    def running_counts(self) -> Dict[str, int]:
+        return {job_type: count for job_type, count in self._running.items() if count}
+
+    def _free_slots(self) -> Dict[str, int]:
+        return {job_type: handler.concurrency - self._running.get(job_type, 0) for job_type, handler in _handlers.items()}
+
+    def requeue_expired_leases(self):
+        """Puts RUNNING jobs whose lease expired (their worker died) back in the queue. Blocking."""
+        cutoff = datetime.utcnow() - timedelta(seconds=JOB_LEASE_SECONDS)
+        with SessionLocal() as db:
+            db.execute(
+                update(models.Job)
+                .where(models.Job.status == models.JobStatus.RUNNING, models.Job.locked_at < cutoff)
+                .values(status=models.JobStatus.QUEUED, locked_at=None, run_after=datetime.utcnow())
+            )
+            db.commit()
+
+    def purge_finished_jobs(self) -> int:
+        """Deletes DONE and DEAD jobs past their retention, in batches. Blocking. Returns the number deleted."""
+        now = datetime.utcnow()
+        deleted = 0
+        with SessionLocal() as db:
+            for status, days in ((models.JobStatus.DONE, JOB_RETENTION_DAYS), (models.JobStatus.DEAD, JOB_DEAD_RETENTION_DAYS)):
+                expired = (
+                    select(models.Job.id)
+                    .where(models.Job.status == status, models.Job.finished_at < now - timedelta(days=days))
+                    .limit(JOB_PURGE_BATCH)
+                )
+                while True:
+                    result = db.execute(delete(models.Job).where(models.Job.id.in_(expired)))
+                    db.commit()
+                    deleted += result.rowcount
+                    if result.rowcount < JOB_PURGE_BATCH:
+                        break
+        return deleted
+
+    def _renew_lease(self, job_id: int):
+        with SessionLocal() as db:
+            db.execute(
+                update(models.Job)
+                .where(models.Job.id == job_id, models.Job.status == models.JobStatus.RUNNING)
+                .values(locked_at=datetime.utcnow())
+            )
+            db.commit()
+
+    def _claim(self, free_slots: Dict[str, int], busy_keys: Set[Tuple[str, object]]) -> List[Tuple[int, str, dict]]:
+        """
+        Claims due jobs for every type with free capacity, highest priority first, skipping jobs
+        whose key is already running. Blocking. Returns (id, job_type, payload) of each claimed job.
+        """
+        claimed = []
+        now = datetime.utcnow()
+        with SessionLocal() as db:
+            for job_type, free in free_slots.items():
+                if free <= 0:
+                    continue
+                handler = _handlers[job_type]
+                candidates = (
+                    db.query(models.Job.id, models.Job.payload)
+                    .filter(models.Job.job_type == job_type, models.Job.status == models.JobStatus.QUEUED, models.Job.run_after <= now)
+                    .order_by(models.Job.priority.desc(), models.Job.id)
+                )
+                if handler.key is None:
+                    candidates = candidates.limit(free)
+                claimed_keys = set()
+                for job_id, encoded in candidates.all():
+                    if free <= 0:
+                        break
+                    payload = json.loads(encoded or "{}")
+                    key = handler.key(payload) if handler.key else None
+                    if key is not None and ((job_type, key) in busy_keys or key in claimed_keys):
+                        continue
+                    # Conditional UPDATE: only one worker can move a given job out of QUEUED.
+                    result = db.execute(
+                        update(models.Job)
+                        .where(models.Job.id == job_id, models.Job.status == models.JobStatus.QUEUED)
+                        .values(status=models.JobStatus.RUNNING, locked_at=now, started_at=now, attempts=models.Job.attempts + 1)
+                    )
+                    if result.rowcount:
+                        claimed.append((job_id, job_type, payload))
+                        free -= 1
+                        if key is not None:
+                            claimed_keys.add(key)
+            db.commit()
+        return claimed
+
+    async def _heartbeat(self, job_id: int):
+        """Keeps a running job's lease fresh, so a long run is not mistaken for a dead worker."""
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            try:
+                await asyncio.to_thread(self._renew_lease, job_id)
+            except Exception:
+                logger.exception("Could not renew the lease of job %s", job_id)
+
+    async def _execute(self, job_id: int, job_type: str, payload: dict, key):
+        handler = _handlers[job_type]
+        error = None
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            if handler.is_async:
+                await handler.func(payload)
+            else:
+                await asyncio.to_thread(handler.func, payload)
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job_id, job_type)
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            heartbeat.cancel()
+            self._running[job_type] -= 1
+            self._running_keys.discard((job_type, key))
+        try:
+            await asyncio.to_thread(self._finish, job_id, error)
+        except Exception:
+            logger.exception("Could not record the outcome of job %s; it is re-run after its lease expires", job_id)
+        self.wake()
+
+    def _finish(self, job_id: int, error: Optional[str]):
+        db = SessionLocal()
+        try:
+            job = db.get(models.Job, job_id)
+            now = datetime.utcnow()
+            job.locked_at = None
+            if error is None:
+                job.status = models.JobStatus.DONE
+                job.finished_at = now
+                job.last_error = None
+            elif job.attempts >= job.max_attempts:
+                job.status = models.JobStatus.DEAD
+                job.finished_at = now
+                job.last_error = error
+            else:
+                job.status = models.JobStatus.QUEUED
+                job.run_after = now + timedelta(seconds=backoff_seconds(job.attempts))
+                job.last_error = error
+            db.commit()
+        finally:
+            db.close()
+
+    async def _dispatch(self):
+        jobs = await asyncio.to_thread(self._claim, self._free_slots(), set(self._running_keys))
+        for job_id, job_type, payload in jobs:
+            handler = _handlers[job_type]
+            key = handler.key(payload) if handler.key else None
+            self._running[job_type] = self._running.get(job_type, 0) + 1
+            if key is not None:
+                self._running_keys.add((job_type, key))
+            task = asyncio.create_task(self._execute(job_id, job_type, payload, key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        await asyncio.to_thread(self.requeue_expired_leases)
+        last_lease_check = datetime.utcnow()
+        last_purge = datetime.min
+        while not self._stopping:
+            try:
+                await self._dispatch()
+                if datetime.utcnow() - last_lease_check > timedelta(seconds=JOB_LEASE_SECONDS / 4):
+                    await asyncio.to_thread(self.requeue_expired_leases)
+                    last_lease_check = datetime.utcnow()
+                if datetime.utcnow() - last_purge > timedelta(seconds=JOB_PURGE_INTERVAL):
+                    last_purge = datetime.utcnow()
+                    purged = await asyncio.to_thread(self.purge_finished_jobs)
+                    if purged:
+                        logger.info("Purged %s finished jobs", purged)
+            except Exception:
+                logger.exception("Job worker loop error")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self):
+        """Stops claiming and waits for jobs already running. Interrupted jobs are re-run after their lease expires."""
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._loop = None
+
+worker = JobWorker()
+
+
+def queue_summary(db: Session, recent: int = 500) -> dict:
+    """
+    Queue depth by type and status, age of the oldest due job, and latency figures over the
+    most recent finished jobs: wait = started_at - created_at, run = finished_at - started_at.
+    """
+    depth = {}
+    for job_type, status, count in db.query(models.Job.job_type, models.Job.status, func.count(models.Job.id)).group_by(models.Job.job_type, models.Job.status):
+        depth.setdefault(job_type, {})[status.value] = count
+    oldest_due = (
+        db.query(func.min(models.Job.run_after))
+        .filter(models.Job.status == models.JobStatus.QUEUED, models.Job.run_after <= datetime.utcnow())
+        .scalar()
+    )
+    finished = (
+        db.query(models.Job.job_type, models.Job.created_at, models.Job.started_at, models.Job.finished_at)
+        .filter(models.Job.status == models.JobStatus.DONE)
+        .order_by(models.Job.finished_at.desc())
+        .limit(recent)
+        .all()
+    )
+    latency = {}
+    for job_type, created_at, started_at, finished_at in finished:
+        if not (created_at and started_at and finished_at):
+            continue
+        entry = latency.setdefault(job_type, {"waits": [], "runs": []})
+        entry["waits"].append((started_at - created_at).total_seconds())
+        entry["runs"].append((finished_at - started_at).total_seconds())
+
+    def p95(values):
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    latency_summary = {
+        job_type: {
+            "count": len(entry["waits"]),
+            "avg_wait_s": sum(entry["waits"]) / len(entry["waits"]),
+            "p95_wait_s": p95(entry["waits"]),
+            "avg_run_s": sum(entry["runs"]) / len(entry["runs"]),
+            "p95_run_s": p95(entry["runs"]),
+        }
+        for job_type, entry in latency.items()
+    }
+    dead = (
+        db.query(models.Job)
+        .filter(models.Job.status == models.JobStatus.DEAD)
+        .order_by(models.Job.finished_at.desc())
+        .limit(20)
+        .all()
+    )
+    return {
+        "depth": depth,
+        "oldest_due_age_s": (datetime.utcnow() - oldest_due).total_seconds() if oldest_due else 0.0,
+        "latency": latency_summary,
+        "running": worker.running_counts(),
+        "dead": dead,
+    }
@@ -0,0 +1,29 @@
+"""
+Job handlers for marketplace-wide maintenance: recounting denormalized figures and rebuilding
+the co-purchase matrix. Queued at startup (main.py) and from the admin jobs page.
+"""
+
+import crud
+import services.recommendation_service
+from database import SessionLocal
+from services.job_queue import job_handler
+
+
+@job_handler("sync_marketplace_stats", concurrency=1, max_attempts=3)
+def sync_marketplace_stats_job(payload: dict):
+    """Links legacy products to categories and recomputes category and artist counts."""
+    db = SessionLocal()
+    try:
+        crud.sync_categories(db)
+        crud.sync_artist_stats(db)
+    finally:
+        db.close()
+
+
+@job_handler("rebuild_co_purchases", concurrency=1, max_attempts=3)
+def rebuild_co_purchases_job(payload: dict):
+    db = SessionLocal()
+    try:
+        services.recommendation_service.rebuild_co_purchases(db)
+    finally:
+        db.close()
@@ -0,0 +1,354 @@
+"""
+Local, data-driven price suggestions.
+
+Instead of asking the LLM for a price on every review-page load, suggestions come from the
+marketplace's own data: listed prices (Product.price_usd), what actually sold and at what price
+(order_items), and how much of the listed stock sold (sell-through). A PriceSnapshot computes, per
+category and for the marketplace as a whole, with vectorized NumPy:
+
+- a price range: the interquartile range of a blend of listed prices and sold prices, where sold
+  prices carry more weight the more units have sold (PRICE_SALES_PRIOR);
+- a suggested price: the median, moved toward the price band with the best expected revenue per
+  listed unit (price x sell-through), within the range, in proportion to the revenue that band
+  gains over the median's band and to the amount of sales data. Near-ties go to the band nearest
+  the median (see summarize_prices).
+
+The snapshot is rebuilt by the "refresh_price_snapshot" job when older than PRICE_SNAPSHOT_MAX_AGE
+(and at startup), so a suggestion is a dict lookup. The LLM is still used, on request, to write a justification for a
+computed range (services.ai_service.explain_price_suggestion).
+
+Backtest against past sales:  python -m services.pricing_service backtest [--cutoff 0.7] [--llm N]
+"""
+
+import argparse
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, NamedTuple, Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import crud
+import models
+from database import SessionLocal
+from services.job_queue import enqueue, job_handler
+
+PRICE_SNAPSHOT_MAX_AGE = int(os.getenv("PRICE_SNAPSHOT_MAX_AGE", "900"))
+PRICE_MIN_SAMPLES = int(os.getenv("PRICE_MIN_SAMPLES", "5"))
+PRICE_SALES_PRIOR = float(os.getenv("PRICE_SALES_PRIOR", "20"))
+PRICE_REVENUE_TOLERANCE = float(os.getenv("PRICE_REVENUE_TOLERANCE", "0.1"))
+PRICE_BANDS = 4
+
+
+class PriceSuggestion(NamedTuple):
+    low: float
+    high: float
+    suggested: float
+    median: float
+    sell_through: float # Units sold / (units sold + units in stock)
+    sample_size: int    # Listed products the figures are based on
+    units_sold: int
+    basis: str          # "category" or "marketplace" (category too small to judge on its own)
+
+    def as_text(self) -> str:
+        """Same first line as the LLM suggestion, so services.ai_service.parse_price_range reads both."""
+        return f"Suggested Price Range: ${self.low:.2f} - ${self.high:.2f}"
+
+
+# --- Statistics ---
+def weighted_quantiles(values: np.ndarray, weights: np.ndarray, quantiles) -> np.ndarray:
+    """Quantiles of a weighted sample (midpoint interpolation, like np.quantile for equal weights)."""
+    order = np.argsort(values, kind="stable")
+    values, weights = values[order], weights[order]
+    positions = (np.cumsum(weights) - 0.5 * weights) / weights.sum()
+    return np.interp(quantiles, positions, values)
+
+def summarize_prices(prices: np.ndarray, stock: np.ndarray, units_sold: np.ndarray, sale_prices: np.ndarray, sale_units: np.ndarray, basis: str) -> Optional[PriceSuggestion]:
+    """
+    One PriceSuggestion for a group of listings.
+    Args:
+        prices, stock, units_sold → Per listed product.
+        sale_prices, sale_units → Per order line (price_at_purchase_usd, quantity) of those products.
+    """
+    if len(prices) == 0:
+        return None
+    total_sold = float(sale_units.sum())
+    # Sold prices are stronger evidence than asking prices, once there are enough of them.
+    sales_weight = total_sold / (total_sold + PRICE_SALES_PRIOR)
+    values = np.concatenate([prices, sale_prices])
+    weights = np.concatenate([
+        np.full(len(prices), (1 - sales_weight) / len(prices)),
+        sale_units * (sales_weight / total_sold) if total_sold else np.zeros(len(sale_prices)),
+    ])
+    low, median, high = weighted_quantiles(values, weights, [0.25, 0.5, 0.75])
+
+    units_listed = units_sold + np.maximum(stock, 0)
+    sell_through = float(units_sold.sum() / units_listed.sum()) if units_listed.sum() else 0.0
+
+    suggested = median
+    if units_sold.sum():
+        # Price bands by listed-price quantile; pick the band that turns listed units into the most revenue.
+        edges = np.quantile(prices, np.linspace(0, 1, PRICE_BANDS + 1))
+        band = np.clip(np.searchsorted(edges, prices, side="right") - 1, 0, PRICE_BANDS - 1)
+        band_products = np.bincount(band, minlength=PRICE_BANDS)
+        band_sold = np.bincount(band, weights=units_sold, minlength=PRICE_BANDS)
+        band_listed = np.bincount(band, weights=units_listed, minlength=PRICE_BANDS)
+        band_price = np.bincount(band, weights=prices, minlength=PRICE_BANDS) / np.maximum(band_products, 1)
+        revenue_per_unit = np.where(band_listed > 0, band_price * band_sold / np.maximum(band_listed, 1), -1.0)
+        # Unless sell-through falls at least as fast as price rises, price x sell-through simply grows
+        # with price, and the top band would win (and be clipped to `high`) almost every time. So
+        # bands within PRICE_REVENUE_TOLERANCE of the best count as ties, settled by the band price
+        # nearest the median, and the suggestion moves from the median toward the winner's price (kept
+        # inside the range) only by the share of revenue it adds over the median's own band, scaled
+        # by how much sales data there is. It reaches `high` only if the top band is far ahead.
+        best = revenue_per_unit.max()
+        ties = np.flatnonzero(revenue_per_unit >= best * (1 - PRICE_REVENUE_TOLERANCE))
+        chosen = ties[int(np.argmin(np.abs(band_price[ties] - median)))]
+        median_band = int(np.clip(np.searchsorted(edges, median, side="right") - 1, 0, PRICE_BANDS - 1))
+        lift = max(0.0, 1 - revenue_per_unit[median_band] / revenue_per_unit[chosen]) if revenue_per_unit[chosen] > 0 else 0.0
+        target = np.clip(band_price[chosen], low, high)
+        suggested = float(median + lift * sales_weight * (target - median))
+
+    return PriceSuggestion(
+        low=round(float(low), 2), high=round(float(high), 2), suggested=round(float(suggested), 2),
+        median=round(float(median), 2), sell_through=round(sell_through, 3),
+        sample_size=len(prices), units_sold=int(total_sold), basis=basis,
+    )
+
+
+# --- Snapshot ---
+class PriceSnapshot:
+    def __init__(self, by_category: Dict[str, PriceSuggestion], overall: Optional[PriceSuggestion]):
+        self.by_category = by_category
+        self.overall = overall
+        self.built_at = time.monotonic()
+
+    def lookup(self, category: str) -> Optional[PriceSuggestion]:
+        return self.by_category.get(crud.normalize_category(category)) or self.overall
+
+def _groups(codes: np.ndarray):
+    """Yields (code, index array) for each distinct code, from one argsort."""
+    if len(codes) == 0:
+        return
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    for start, end in zip(starts, np.r_[starts[1:], len(codes)]):
+        yield int(sorted_codes[start]), order[start:end]
+
+def build_snapshot(db: Session, as_of: Optional[datetime] = None, exclude_product_ids: Iterable[int] = ()) -> PriceSnapshot:
+    """
+    Computes suggestions for every category from one pass over products and order lines.
+    Args:
+        as_of → Only count sales before this time (stock is rolled back by the later sales); for backtests.
+        exclude_product_ids → Leave these products out entirely; for backtests.
+    """
+    listings = db.execute(
+        select(models.Product.id, models.Product.price_usd, models.Product.stock, models.Product.category, models.Category.slug)
+        .outerjoin(models.Category, models.Category.id == models.Product.category_id)
+        .order_by(models.Product.id)
+    ).all()
+    excluded = set(exclude_product_ids)
+    listings = [row for row in listings if row.id not in excluded and row.price_usd is not None and row.price_usd > 0]
+    if not listings:
+        return PriceSnapshot({}, None)
+
+    product_ids = np.array([row.id for row in listings], dtype=np.int64)
+    prices = np.array([row.price_usd for row in listings], dtype=np.float64)
+    stock = np.array([row.stock or 0 for row in listings], dtype=np.float64)
+    # Legacy products without a category_id are grouped by their normalized category text.
+    slugs, codes = np.unique([row.slug or crud.normalize_category(row.category) for row in listings], return_inverse=True)
+
+    sales = db.execute(
+        select(models.OrderItem.product_id, models.OrderItem.price_at_purchase_usd, models.OrderItem.quantity, models.Order.created_at)
+        .join(models.Order, models.Order.id == models.OrderItem.order_id)
+        .where(models.Order.status != models.OrderStatus.CANCELED, models.OrderItem.product_id.is_not(None))
+    ).all()
+    # Map each order line to its listing; lines of excluded or unpriced products are dropped.
+    sale_product_ids = np.array([row.product_id for row in sales], dtype=np.int64)
+    sale_index = np.minimum(np.searchsorted(product_ids, sale_product_ids), len(product_ids) - 1)
+    listed = product_ids[sale_index] == sale_product_ids
+    sale_index = sale_index[listed]
+    sale_prices = np.array([row.price_at_purchase_usd or 0.0 for row in sales], dtype=np.float64)[listed]
+    sale_units = np.array([row.quantity or 0 for row in sales], dtype=np.float64)[listed]
+    if as_of is not None:
+        before = np.array([row.created_at is not None and row.created_at < as_of for row in sales], dtype=bool)[listed]
+        # Units sold after as_of were still in stock at as_of.
+        stock += np.bincount(sale_index[~before], weights=sale_units[~before], minlength=len(product_ids))
+        sale_index, sale_prices, sale_units = sale_index[before], sale_prices[before], sale_units[before]
+    units_sold = np.bincount(sale_index, weights=sale_units, minlength=len(product_ids))
+    sale_codes = codes[sale_index]
+
+    overall = summarize_prices(prices, stock, units_sold, sale_prices, sale_units, basis="marketplace")
+    sales_by_code = dict(_groups(sale_codes))
+    by_category = {}
+    for code, members in _groups(codes):
+        if len(members) < PRICE_MIN_SAMPLES or not slugs[code]:
+            continue # Lookups fall back to the marketplace-wide figures
+        sale_members = sales_by_code.get(code, np.array([], dtype=np.int64))
+        by_category[str(slugs[code])] = summarize_prices(
+            prices[members], stock[members], units_sold[members], sale_prices[sale_members], sale_units[sale_members], basis="category",
+        )
+    return PriceSnapshot(by_category, overall)
+
+
+class PricingEngine:
+    """
+    Serves suggestions from the current snapshot and queues a rebuild when it is old or missing.
+    Request handlers never build a snapshot themselves: until the first one exists they get None
+    and fall back to the AI.
+    """
+
+    def __init__(self, max_age: int = PRICE_SNAPSHOT_MAX_AGE):
+        self.max_age = max_age
+        self._snapshot: Optional[PriceSnapshot] = None
+        self._refresh_requested_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def load(self, db: Session, snapshot: Optional[PriceSnapshot] = None):
+        snapshot = snapshot or build_snapshot(db)
+        with self._lock:
+            self._snapshot = snapshot
+
+    def refresh_finished(self):
+        """Called when a refresh job ends, successfully or not, so that the next stale lookup asks again."""
+        with self._lock:
+            self._refresh_requested_at = None
+
+    def _request_refresh(self):
+        now = time.monotonic()
+        with self._lock:
+            # A request older than max_age is assumed lost (e.g. the job was deduplicated or never ran).
+            if self._refresh_requested_at is not None and now - self._refresh_requested_at < self.max_age:
+                return
+            self._refresh_requested_at = now
+        # Its own short session: committing the caller's would also commit whatever the route has pending.
+        with SessionLocal() as db:
+            enqueue(db, "refresh_price_snapshot", unique=True, commit=True)
+
+    def suggest(self, db: Session, category: str, build_if_missing: bool = False) -> Optional[PriceSuggestion]:
+        """
+        The suggestion for a category (marketplace-wide if the category is new or small); None without
+        any data, or while the first snapshot is still being built.
+        Args:
+            build_if_missing → Build the first snapshot synchronously instead; for background jobs only.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            if not build_if_missing:
+                self._request_refresh()
+                return None
+            self.load(db)
+            snapshot = self._snapshot
+        elif time.monotonic() - snapshot.built_at > self.max_age:
+            self._request_refresh()
+        return snapshot.lookup(category)
+
+engine = PricingEngine()
+
+@job_handler("refresh_price_snapshot", concurrency=1, max_attempts=3)
+def refresh_price_snapshot_job(payload: dict):
+    db = SessionLocal()
+    try:
+        engine.load(db)
+    finally:
+        db.close()
+        engine.refresh_finished()
+
+
+# --- Backtest ---
+def backtest(db: Session, cutoff: float = 0.7, llm_samples: int = 0) -> dict:
+    """
+    Replays pricing for products whose first sale came after a cutoff point in the order history:
+    the engine sees only earlier sales and never the product itself, and its answer is compared with
+    the price the product actually sold at. A marketplace-wide median is reported as the baseline;
+    with llm_samples > 0 the old LLM suggestion is scored on that many of the same products.
+    Args:
+        cutoff → Fraction of the order history (by order time) treated as the past.
+    Returns:
+        {"cutoff": datetime, "products": int, "engine": metrics, "baseline": metrics[, "llm": metrics]}
+        where metrics = {"coverage": share of sale prices inside the range, "mape": mean abs % error
+        of the suggested price, "median_ape": median abs % error}.
+    """
+    rows = db.execute(
+        select(models.OrderItem.product_id, models.OrderItem.price_at_purchase_usd, models.OrderItem.quantity, models.Order.created_at)
+        .join(models.Order, models.Order.id == models.OrderItem.order_id)
+        .where(models.Order.status != models.OrderStatus.CANCELED, models.Order.created_at.is_not(None))
+        .order_by(models.Order.created_at)
+    ).all()
+    if not rows:
+        return {"cutoff": None, "products": 0}
+    cutoff_at = rows[min(len(rows) - 1, int(len(rows) * cutoff))].created_at
+
+    first_sale, revenue, units = {}, {}, {}
+    for row in rows:
+        first_sale.setdefault(row.product_id, row.created_at)
+        revenue[row.product_id] = revenue.get(row.product_id, 0.0) + (row.price_at_purchase_usd or 0.0) * (row.quantity or 0)
+        units[row.product_id] = units.get(row.product_id, 0) + (row.quantity or 0)
+    held_out = [pid for pid, first in first_sale.items() if first >= cutoff_at and units[pid]]
+    if not held_out:
+        return {"cutoff": cutoff_at, "products": 0}
+    categories = dict(db.query(models.Product.id, models.Product.category).filter(models.Product.id.in_(held_out)).all())
+    held_out = [pid for pid in held_out if pid in categories]
+
+    snapshot = build_snapshot(db, as_of=cutoff_at, exclude_product_ids=held_out)
+    actual = np.array([revenue[pid] / units[pid] for pid in held_out])
+    suggestions = [snapshot.lookup(categories[pid] or "") for pid in held_out]
+
+    def metrics(lows, highs, points, truth):
+        # A missing suggestion (NaN) counts as a miss for coverage and is left out of the errors.
+        errors = np.abs(points - truth) / truth
+        answered = ~np.isnan(errors)
+        return {
+            "coverage": round(float(np.mean((truth >= lows) & (truth <= highs))), 3),
+            "mape": round(float(np.mean(errors[answered])), 3) if answered.any() else None,
+            "median_ape": round(float(np.median(errors[answered])), 3) if answered.any() else None,
+        }
+
+    engine_lows = np.array([s.low if s else np.nan for s in suggestions])
+    engine_highs = np.array([s.high if s else np.nan for s in suggestions])
+    engine_points = np.array([s.suggested if s else np.nan for s in suggestions])
+    overall = snapshot.overall
+    baseline = np.full(len(held_out), overall.median if overall else np.nan)
+    result = {
+        "cutoff": cutoff_at,
+        "products": len(held_out),
+        "engine": metrics(engine_lows, engine_highs, engine_points, actual),
+        "baseline": metrics(baseline, baseline, baseline, actual),
+    }
+
+    if llm_samples:
+        import services.ai_service
+        sample = list(range(min(llm_samples, len(held_out))))
+        ranges = []
+        for i in sample:
+            product = crud.get_product(db, held_out[i])
+            text = services.ai_service.suggest_product_price(name=product.name, category=product.category, artist_notes=product.artist_notes or "")
+            ranges.append(services.ai_service.parse_price_range(text) or (np.nan, np.nan))
+        lows, highs = np.array([r[0] for r in ranges]), np.array([r[1] for r in ranges])
+        result["llm"] = metrics(lows, highs, (lows + highs) / 2, actual[sample])
+        result["llm"]["products"] = len(sample)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Price suggestion engine tools.")
+    parser.add_argument("command", choices=["backtest", "show"])
+    parser.add_argument("--cutoff", type=float, default=0.7, help="Fraction of order history used as the past (backtest).")
+    parser.add_argument("--llm", type=int, default=0, help="Also score the LLM suggestion on this many products (backtest).")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        if args.command == "backtest":
+            print(backtest(session, cutoff=args.cutoff, llm_samples=args.llm))
+        else:
+            snapshot = build_snapshot(session)
+            for slug, suggestion in sorted(snapshot.by_category.items()):
+                print(f"{slug:<24} {suggestion}")
+            print(f"{'(marketplace)':<24} {snapshot.overall}")
+    finally:
+        session.close()
@@ -0,0 +1,384 @@
+"""
+On-demand request profiling for live workers.
+
+A request is profiled when an operator asks for it (the X-Profile header, see ProfilerMiddleware in
+main.py) or when it falls in the sampled fraction of traffic (settings.sample_rate). A profiled
+request gets:
+
+- a statistical stack profile: a sampler thread takes the event-loop thread's stack every
+  PROFILE_INTERVAL_MS while the request is in flight. Only stacks that run through this request's
+  own frames count as its samples. Work the request hands to a worker thread (run_in_threadpool,
+  asyncio.to_thread, sync dependencies) is sampled too, under a "[worker thread]" root:
+  install_thread_hooks() wraps both ways into the thread pools so that such a call registers its
+  thread with the sampler while it runs. A tick where neither is running (awaiting I/O, other
+  requests on the loop) counts under "[not running]".
+  Without parallel threads the profile adds up to wall-clock time;
+- every SQL statement issued through the database.py engine, with its duration.
+
+Header-profiled requests are always saved. Sampled requests, and unprofiled requests (timing only),
+are saved when slower than settings.slow_ms. Saved entries go to a bounded on-disk ring buffer
+(PROFILE_DIR, PROFILE_MAX_ENTRIES): NNNN.json holds the metadata and SQL, and NNNN.folded holds
+the stacks in collapsed "frame;frame;frame count" format. That format is accepted as-is by
+flamegraph.pl, speedscope and inferno. Browse them at /admin/profiles.
+
+When nothing is being profiled, a request costs two perf_counter calls and a header scan, and each
+SQL statement costs one ContextVar lookup. The sampler thread sleeps.
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import anyio.to_thread
+from sqlalchemy import event
+
+from database import engine
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "") # Lets non-browser clients profile without an operator session
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_ENTRIES = int(os.getenv("PROFILE_MAX_ENTRIES", "200"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_SQL = int(os.getenv("PROFILE_MAX_SQL", "500"))
+PROFILE_MAX_DEPTH = 256
+NOT_RUNNING_FRAME = "[not running]"
+WORKER_THREAD_FRAME = "[worker thread]"
+
+
+class ProfilerSettings:
+    """Runtime knobs, changeable from /admin/profiles without a restart (per worker process)."""
+
+    def __init__(self):
+        self.sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+        self.slow_ms = float(os.getenv("PROFILE_SLOW_MS", "1000"))
+
+settings = ProfilerSettings()
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str, query: str, reason: str):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.reason = reason # "header" or "sampled"
+        self.started_at = datetime.utcnow()
+        self.thread_id = threading.get_ident()
+        self.anchor = None   # Frame of profile_request(); a stack running through it belongs to this request
+        self.stacks: Counter = Counter()
+        self.sql: List[dict] = []
+        self.sql_dropped = 0
+        self.status: Optional[int] = None
+        self.seq: Optional[int] = None
+
+    def record_sql(self, statement: str, duration_ms: float, executemany: bool):
+        if len(self.sql) >= PROFILE_MAX_SQL:
+            self.sql_dropped += 1
+            return
+        self.sql.append({"statement": statement[:2000], "ms": round(duration_ms, 3), "executemany": executemany})
+
+_current: ContextVar[Optional[RequestProfile]] = ContextVar("artiflex_profile", default=None)
+
+
+# --- SQL capture ---
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    if profile is not None and conn.info.get("profile_query_start"):
+        started = conn.info["profile_query_start"].pop()
+        profile.record_sql(statement, (time.perf_counter() - started) * 1000, executemany)
+
+
+# --- Stack sampling ---
+class _Sampler:
+    """One daemon thread that samples the stacks of all requests being profiled; idle when there are none."""
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self._active: Dict[int, RequestProfile] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._labels: Dict[object, str] = {}
+        self._thread_ident: Optional[int] = None
+        self._worker_threads: Dict[int, RequestProfile] = {} # Thread ident -> profile of the call it is running
+
+    def add(self, profile: RequestProfile):
+        with self._lock:
+            self._active[id(profile)] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def remove(self, profile: RequestProfile):
+        with self._lock:
+            self._active.pop(id(profile), None)
+            if not self._active:
+                self._wakeup.clear()
+
+    def enter_thread(self, profile: RequestProfile):
+        self._worker_threads[threading.get_ident()] = profile
+
+    def exit_thread(self):
+        self._worker_threads.pop(threading.get_ident(), None)
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            # Library frames keep their package path, app frames their path in the repo.
+            filename = code.co_filename.rsplit("site-packages" + os.sep, 1)[-1].removeprefix(os.getcwd() + os.sep)
+            label = f"{getattr(code, 'co_qualname', code.co_name)} ({filename}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def _stack(self, codes) -> str:
+        return ";".join(self._label(code) for code in reversed(codes))
+
+    def _worker_stacks(self) -> Dict[int, List[str]]:
+        """{id(profile): [stack, ...]} for worker threads running calls for a profiled request."""
+        stacks: Dict[int, List[str]] = {}
+        frames = sys._current_frames()
+        frame = None
+        try:
+            for thread_id, profile in list(self._worker_threads.items()):
+                if id(profile) not in self._active:
+                    continue
+                frame = frames.get(thread_id)
+                codes = []
+                # Everything above _run_for_profile is the call the request handed over.
+                while frame is not None and frame.f_code is not _RUN_FOR_PROFILE_CODE and len(codes) < PROFILE_MAX_DEPTH:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                if codes and frame is not None:
+                    stacks.setdefault(id(profile), []).append(WORKER_THREAD_FRAME + ";" + self._stack(codes))
+        finally:
+            del frames, frame
+        return stacks
+
+    def _sample(self):
+        # Holding the lock for the whole pass means that once remove() returns, no sample can still
+        # land in that profile's counters.
+        with self._lock:
+            worker_stacks = self._worker_stacks()
+            frames = sys._current_frames()
+            frame = None
+            try:
+                for profile in self._active.values():
+                    frame = frames.get(profile.thread_id)
+                    codes = []
+                    while frame is not None and len(codes) < PROFILE_MAX_DEPTH:
+                        if frame is profile.anchor:
+                            break
+                        codes.append(frame.f_code)
+                        frame = frame.f_back
+                    in_request = frame is profile.anchor and codes
+                    if in_request:
+                        profile.stacks[self._stack(codes)] += 1
+                    for stack in worker_stacks.get(id(profile), ()):
+                        profile.stacks[stack] += 1
+                    if not in_request and id(profile) not in worker_stacks:
+                        profile.stacks[NOT_RUNNING_FRAME] += 1
+            finally:
+                del frames, frame
+
+    def _run(self):
+        self._thread_ident = threading.get_ident()
+        while True:
+            self._wakeup.wait()
+            time.sleep(self.interval)
+            self._sample()
+
+sampler = _Sampler()
+
+
+# --- Worker threads ---
+def _run_for_profile(profile: RequestProfile, func, *args, **kwargs):
+    """Runs func in a worker thread that the sampler attributes to profile meanwhile."""
+    sampler.enter_thread(profile)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        sampler.exit_thread()
+
+_RUN_FOR_PROFILE_CODE = _run_for_profile.__code__
+
+def _for_profile(func):
+    """func, wrapped with _run_for_profile if the calling request is being profiled."""
+    profile = _current.get()
+    return functools.partial(_run_for_profile, profile, func) if profile is not None else func
+
+_anyio_run_sync = anyio.to_thread.run_sync
+
+async def _run_sync(func, *args, **kwargs):
+    return await _anyio_run_sync(_for_profile(func), *args, **kwargs)
+
+class _ProfilingExecutor(concurrent.futures.ThreadPoolExecutor):
+    """The event loop's default executor (asyncio.to_thread, run_in_executor(None, ...))."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(_for_profile(fn), *args, **kwargs)
+
+def install_thread_hooks():
+    """
+    Routes calls handed to worker threads through _run_for_profile: anyio.to_thread.run_sync, which
+    Starlette and FastAPI use for sync endpoints and dependencies, run_in_threadpool and streaming
+    iterators, and the running loop's default executor. Called from the app lifespan; calls made
+    outside a profiled request only pay one ContextVar lookup.
+    """
+    anyio.to_thread.run_sync = _run_sync
+    asyncio.get_running_loop().set_default_executor(_ProfilingExecutor(thread_name_prefix="asyncio"))
+
+
+# --- Ring buffer ---
+class ProfileStore:
+    """The last `capacity` captures on disk. Entry seq lives in slot seq % capacity, overwriting the oldest."""
+
+    def __init__(self, directory: str = PROFILE_DIR, capacity: int = PROFILE_MAX_ENTRIES):
+        self.directory = directory
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._next_seq: Optional[int] = None
+
+    def _path(self, seq: int, extension: str) -> str:
+        return os.path.join(self.directory, f"{seq % self.capacity:04d}.{extension}")
+
+    def allocate(self) -> int:
+        with self._lock:
+            if self._next_seq is None:
+                self._next_seq = max((entry["seq"] for entry in self.entries()), default=0) + 1
+            seq = self._next_seq
+            self._next_seq += 1
+            return seq
+
+    def save(self, seq: int, meta: dict, folded: Optional[str] = None):
+        os.makedirs(self.directory, exist_ok=True)
+        # A stale .folded from the entry this one replaces must not survive next to the new metadata.
+        folded_path = self._path(seq, "folded")
+        if folded is not None:
+            with open(folded_path + ".tmp", "w") as f:
+                f.write(folded)
+            os.replace(folded_path + ".tmp", folded_path)
+        elif os.path.exists(folded_path):
+            os.remove(folded_path)
+        json_path = self._path(seq, "json")
+        with open(json_path + ".tmp", "w") as f:
+            json.dump({**meta, "seq": seq}, f)
+        os.replace(json_path + ".tmp", json_path)
+
+    def entries(self) -> List[dict]:
+        """Metadata of every stored capture, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        result = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                try:
+                    with open(os.path.join(self.directory, name)) as f:
+                        result.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return sorted(result, key=lambda entry: entry["seq"], reverse=True)
+
+    def get(self, seq: int) -> Optional[dict]:
+        try:
+            with open(self._path(seq, "json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get("seq") == seq else None
+
+    def folded(self, seq: int) -> Optional[str]:
+        if self.get(seq) is None:
+            return None
+        try:
+            with open(self._path(seq, "folded")) as f:
+                return f.read()
+        except OSError:
+            return None
+
+store = ProfileStore()
+
+
+# --- Request hooks (called by ProfilerMiddleware) ---
+def requested_by_header(scope) -> Optional[bytes]:
+    """Value of the X-Profile header, or None."""
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            return value
+    return None
+
+def token_matches(value: bytes) -> bool:
+    return bool(PROFILE_TOKEN) and value.decode("latin-1") == PROFILE_TOKEN
+
+def _meta(scope, duration_ms: float, status: Optional[int], reason: str) -> dict:
+    return {
+        "method": scope["method"], "path": scope["path"], "query": scope.get("query_string", b"").decode("latin-1"),
+        "status": status, "duration_ms": round(duration_ms, 2), "reason": reason,
+        "captured_at": datetime.utcnow().isoformat(timespec="seconds"),
+    }
+
+def _folded(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+async def record_slow(scope, duration_ms: float):
+    """Unprofiled requests over settings.slow_ms: a timing-only entry, so slow endpoints show up even at sample_rate 0."""
+    await asyncio.to_thread(store.save, store.allocate(), _meta(scope, duration_ms, None, "slow"))
+
+async def profile_request(app, scope, receive, send, reason: str):
+    """Runs the rest of the ASGI app for this request under the profiler."""
+    profile = RequestProfile(scope["method"], scope["path"], scope.get("query_string", b"").decode("latin-1"), reason)
+    profile.anchor = sys._getframe()
+    if reason == "header":
+        profile.seq = store.allocate()
+
+    async def send_wrapper(message):
+        if message["type"] == "http.response.start":
+            profile.status = message["status"]
+            if profile.seq is not None:
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", str(profile.seq).encode())]
+        await send(message)
+
+    token = _current.set(profile)
+    sampler.add(profile)
+    start = time.perf_counter()
+    try:
+        await app(scope, receive, send_wrapper)
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        sampler.remove(profile)
+        _current.reset(token)
+        profile.anchor = None
+    if reason == "header" or duration_ms >= settings.slow_ms:
+        meta = _meta(scope, duration_ms, profile.status, reason)
+        meta.update({
+            "samples": sum(profile.stacks.values()), "interval_ms": PROFILE_INTERVAL_MS,
+            "sql": profile.sql, "sql_count": len(profile.sql) + profile.sql_dropped, "sql_dropped": profile.sql_dropped,
+            "sql_ms": round(sum(query["ms"] for query in profile.sql), 2),
+        })
+        seq = profile.seq if profile.seq is not None else store.allocate()
+        await asyncio.to_thread(store.save, seq, meta, _folded(profile.stacks))
+
+def top_frames(folded: str, limit: int = 15) -> List[tuple]:
+    """(frame, self samples, total samples) for the hottest frames of a collapsed-stack profile."""
+    self_counts, total_counts = Counter(), Counter()
+    for line in folded.splitlines():
+        stack, _, count = line.rpartition(" ")
+        frames = stack.split(";")
+        self_counts[frames[-1]] += int(count)
+        for frame in set(frames):
+            total_counts[frame] += int(count)
+    return [(frame, count, total_counts[frame]) for frame, count in self_counts.most_common(limit)]
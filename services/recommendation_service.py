@@ -0,0 +1,173 @@
+"""
+"Frequently bought together" recommendations.
+
+The co-purchase matrix lives in the product_co_purchases table (one row per ordered product pair).
+crud.create_order updates it incrementally in the order's transaction (and queues a
+"refresh_recommendations" job for the in-memory index); rebuild_co_purchases()
+recomputes it from order_items in one vectorized pass. Pages never aggregate per request: they read
+the top-K neighbours of a product from RecommendationIndex, a compact in-memory map that is loaded
+once and refreshed for just the products touched by each new order.
+
+Offline rebuild:  python -m services.recommendation_service
+"""
+
+import os
+import threading
+from array import array
+from typing import Dict, Iterable, List
+
+import numpy as np
+from sqlalchemy import delete, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+from services.job_queue import job_handler
+
+RECOMMENDATIONS_TOP_K = int(os.getenv("RECOMMENDATIONS_TOP_K", "8"))
+
+
+# --- Matrix maintenance ---
+def record_order_products(db: Session, product_ids: Iterable[int]):
+    """
+    Adds one co-purchase for every ordered pair of distinct products in an order.
+    Runs inside the caller's transaction (no commit) so it lands atomically with the order.
+    """
+    unique_ids = sorted(set(pid for pid in product_ids if pid is not None))
+    pairs = [{"product_id": a, "other_product_id": b, "order_count": 1} for a in unique_ids for b in unique_ids if a != b]
+    if not pairs:
+        return
+    stmt = sqlite_insert(models.ProductCoPurchase).values(pairs)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["product_id", "other_product_id"],
+        set_={"order_count": models.ProductCoPurchase.order_count + 1},
+    )
+    db.execute(stmt)
+
+def compute_co_purchases(order_ids: np.ndarray, product_ids: np.ndarray):
+    """
+    Vectorized co-occurrence counts from (order_id, product_id) pairs.
+    Returns (product_id, other_product_id, order_count) arrays for every pair bought together.
+    """
+    if len(order_ids) == 0:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, empty
+    # One entry per distinct (order, product), grouped by order.
+    pairs = np.unique(np.stack([order_ids, product_ids], axis=1).astype(np.int64), axis=0)
+    orders, products = pairs[:, 0], pairs[:, 1]
+
+    group_starts = np.flatnonzero(np.r_[True, orders[1:] != orders[:-1]])
+    group_sizes = np.diff(np.r_[group_starts, len(orders)])
+    # For each element, the start and size of its order's group.
+    element_start = np.repeat(group_starts, group_sizes)
+    element_size = np.repeat(group_sizes, group_sizes)
+
+    # Pair every element with every element of its own order (size^2 pairs per order), then drop self-pairs.
+    left = np.repeat(np.arange(len(orders)), element_size)
+    block_offsets = np.repeat(np.cumsum(element_size) - element_size, element_size)
+    right = np.repeat(element_start, element_size) + (np.arange(len(left)) - block_offsets)
+    keep = left != right
+    left, right = products[left[keep]], products[right[keep]]
+
+    stride = int(products.max()) + 1
+    keys, counts = np.unique(left * stride + right, return_counts=True)
+    return keys // stride, keys % stride, counts
+
+def rebuild_co_purchases(db: Session) -> int:
+    """Recomputes the whole co-purchase table from order_items. Returns the number of pairs written."""
+    rows = db.execute(
+        select(models.OrderItem.order_id, models.OrderItem.product_id)
+        .where(models.OrderItem.order_id.is_not(None), models.OrderItem.product_id.is_not(None))
+    ).all()
+    data = np.array(rows, dtype=np.int64).reshape(-1, 2)
+    left, right, counts = compute_co_purchases(data[:, 0], data[:, 1])
+
+    db.execute(delete(models.ProductCoPurchase))
+    batch_size = 5000
+    for start in range(0, len(counts), batch_size):
+        db.execute(insert(models.ProductCoPurchase), [
+            {"product_id": int(a), "other_product_id": int(b), "order_count": int(n)}
+            for a, b, n in zip(left[start:start + batch_size], right[start:start + batch_size], counts[start:start + batch_size])
+        ])
+    db.commit()
+    if index._loaded:
+        index.load(db)
+    return len(counts)
+
+
+# --- In-memory top-K index ---
+class RecommendationIndex:
+    """Top-K co-purchased product ids per product, stored as compact int arrays."""
+
+    def __init__(self, top_k: int = RECOMMENDATIONS_TOP_K):
+        self.top_k = top_k
+        self._neighbours: Dict[int, array] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _top_k_by_product(self, rows) -> Dict[int, array]:
+        # rows are ordered by product_id, order_count desc, so the first K per product are the top K.
+        result: Dict[int, array] = {}
+        for product_id, other_product_id in rows:
+            neighbours = result.setdefault(product_id, array("i"))
+            if len(neighbours) < self.top_k:
+                neighbours.append(other_product_id)
+        return result
+
+    def _query(self, db: Session, product_ids=None):
+        stmt = select(models.ProductCoPurchase.product_id, models.ProductCoPurchase.other_product_id)
+        if product_ids is not None:
+            stmt = stmt.where(models.ProductCoPurchase.product_id.in_(product_ids))
+        stmt = stmt.order_by(
+            models.ProductCoPurchase.product_id,
+            models.ProductCoPurchase.order_count.desc(),
+            models.ProductCoPurchase.other_product_id,
+        )
+        return db.execute(stmt)
+
+    def load(self, db: Session):
+        neighbours = self._top_k_by_product(self._query(db))
+        with self._lock:
+            self._neighbours = neighbours
+            self._loaded = True
+
+    def refresh(self, db: Session, product_ids: Iterable[int]):
+        """Recomputes the top K of just these products, e.g. after an order that contained them."""
+        product_ids = list(set(product_ids))
+        if not self._loaded or not product_ids:
+            return
+        updated = self._top_k_by_product(self._query(db, product_ids))
+        with self._lock:
+            for product_id in product_ids:
+                if product_id in updated:
+                    self._neighbours[product_id] = updated[product_id]
+                else:
+                    self._neighbours.pop(product_id, None)
+
+    def related(self, db: Session, product_id: int) -> List[int]:
+        if not self._loaded:
+            self.load(db)
+        return list(self._neighbours.get(product_id, ()))
+
+index = RecommendationIndex()
+
+@job_handler("refresh_recommendations", concurrency=2)
+def refresh_recommendations_job(payload: dict):
+    """Queued by crud.create_order so the checkout request does not wait for the index refresh."""
+    db = SessionLocal()
+    try:
+        index.refresh(db, payload["product_ids"])
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    from database import Base, engine
+
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        print(f"Rebuilt {rebuild_co_purchases(session)} co-purchase pairs.")
+    finally:
+        session.close()
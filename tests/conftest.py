@@ -0,0 +1,59 @@
+"""
+Shared fixtures. The app reads its configuration from the environment at import time, so a
+throwaway database, flash-sale log and profile directory are set up here before anything
+imports main or database.
+"""
+import itertools
+import os
+import sys
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="artiflex-tests-")
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{_tmp}/test.db",
+    SECRET_KEY="test-secret",
+    FLASH_SALE_LOG=f"{_tmp}/flash_sale.log",
+    PROFILE_DIR=f"{_tmp}/profiles",
+    USE_FAKE_AI_MODEL="1",
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import crud
+import main
+import schemas
+from database import SessionLocal
+
+PASSWORD = "test-password"
+_emails = itertools.count(1)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client():
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def make_user(db):
+    """make_user(role) → a new user with a unique email and the password PASSWORD."""
+    def _make_user(role: str = "customer"):
+        email = f"{role}{next(_emails)}@example.com"
+        return crud.create_user(db, schemas.UserCreate(email=email, full_name=role.title(), password=PASSWORD, role=role))
+    return _make_user
+
+
+def login(client: TestClient, user) -> None:
+    response = client.post("/login", data={"email": user.email, "password": PASSWORD}, follow_redirects=False)
+    assert response.status_code == 303, response.text
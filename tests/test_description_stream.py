@@ -0,0 +1,77 @@
+import io
+import json
+import os
+
+import pytest
+
+import services.ai_service
+from conftest import login
+
+STREAM_URL = "/artist/manage/products/review/description-stream"
+
+
+def parse_events(body: str):
+    """[(event, data)] from a text/event-stream body; event is None for plain data messages."""
+    events = []
+    for block in body.split("\n\n"):
+        if not block.strip():
+            continue
+        event, data = None, None
+        for line in block.split("\n"):
+            field, _, value = line.partition(": ")
+            if field == "event":
+                event = value
+            elif field == "data":
+                data = json.loads(value)
+        events.append((event, data))
+    return events
+
+
+@pytest.fixture
+def artist_client(client, make_user):
+    """A client logged in as an artist with a product at the review step."""
+    uploads = os.path.join("static", "uploads")
+    existing = set(os.listdir(uploads))
+    login(client, make_user("artist"))
+    response = client.post(
+        "/artist/manage/products/new",
+        data={"name": "Stream Test Vase", "category": "Pottery", "artist_notes": "Wheel-thrown stoneware."},
+        files={"image": ("vase.jpg", io.BytesIO(b"not really a jpeg"), "image/jpeg")},
+        follow_redirects=False,
+    )
+    assert response.status_code == 303
+    yield client
+    for name in set(os.listdir(uploads)) - existing:
+        os.remove(os.path.join(uploads, name))
+
+
+def test_description_stream_relays_chunks_in_order(artist_client, monkeypatch):
+    fake = services.ai_service.FakeStreamingModel(chunk_size=7)
+    monkeypatch.setattr(services.ai_service, "model", fake)
+
+    response = artist_client.get(STREAM_URL)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_events(response.text)
+    chunks = [data for event, data in events if event is None]
+    expected = fake.text_for(services.ai_service._description_prompt("Stream Test Vase", "Pottery", "Wheel-thrown stoneware."))
+    assert len(chunks) > 1
+    assert "".join(chunks) == expected
+    assert "Suggested Price Range" not in expected
+    assert events[-1] == ("done", "")
+
+
+def test_description_stream_reports_errors_then_finishes(artist_client, monkeypatch):
+    monkeypatch.setattr(services.ai_service, "model", services.ai_service.FakeStreamingModel(chunk_size=7, fail_after=2))
+
+    events = parse_events(artist_client.get(STREAM_URL).text)
+
+    assert [event for event, _ in events] == [None, None, "error", "done"]
+    assert "fake model stream interrupted" in events[2][1]
+
+
+def test_description_stream_without_product_in_progress(client, make_user):
+    login(client, make_user("artist"))
+
+    assert client.get(STREAM_URL).status_code == 404
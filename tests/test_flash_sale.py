@@ -0,0 +1,210 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+import crud
+import models
+import services.flash_sale
+from database import SessionLocal
+
+SHIPPING = {"address": "1 Market St", "city": "Jaipur", "zip": "302001", "country": "IN", "paymentMethod": "COD"}
+
+
+@pytest.fixture
+def manager(monkeypatch, tmp_path):
+    """A fresh FlashSaleManager with its own reservation log, installed as the one crud uses."""
+    fresh = services.flash_sale.FlashSaleManager(log_path=str(tmp_path / "reservations.log"))
+    monkeypatch.setattr(services.flash_sale, "manager", fresh)
+    return fresh
+
+
+@pytest.fixture
+def make_product(db, make_user):
+    def _make_product(stock: int):
+        seller = make_user("artist")
+        return crud.create_product(db, seller.id, "Limited Vase", "Pottery", "", "", 40.0, stock, "vase.jpg")
+    return _make_product
+
+
+class FakeClock:
+    """Replaces the time module in services.flash_sale so reservations can be aged without waiting."""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(services.flash_sale, "time", fake)
+    return fake
+
+
+def checkout(db, customer_id: int, product_id: int):
+    crud.add_item_to_cart(db, customer_id, product_id)
+    try:
+        return crud.create_order(db, customer_id, crud.get_cart_items(db, customer_id), SHIPPING)
+    finally:
+        crud.clear_customer_cart(db, customer_id)
+
+
+def switch_mode(manager, product_id: int, enabled: bool):
+    with SessionLocal() as db:
+        product = db.get(models.Product, product_id)
+        (manager.enable if enabled else manager.disable)(db, product)
+
+
+def switch_mode_during_checkout(monkeypatch, manager, product_id: int, enabled: bool) -> threading.Thread:
+    """Makes the next checkout start a mode switch from another thread right after claiming its units."""
+    begin_checkout = manager.begin_checkout
+    switcher = threading.Thread(target=switch_mode, args=(manager, product_id, enabled))
+
+    def begin_checkout_then_switch(customer_id, items):
+        hold = begin_checkout(customer_id, items)
+        switcher.start()
+        switcher.join(timeout=0.2)
+        assert switcher.is_alive(), "the mode switch did not wait for the checkout to finish"
+        return hold
+
+    monkeypatch.setattr(manager, "begin_checkout", begin_checkout_then_switch)
+    return switcher
+
+
+def stock_after_flush(db, manager, product_id: int) -> int:
+    manager.flush(db)
+    db.expire_all()
+    return db.get(models.Product, product_id).stock
+
+
+def test_enable_during_checkout_counts_the_sale_once(db, make_user, make_product, manager, monkeypatch):
+    product = make_product(stock=5)
+    switcher = switch_mode_during_checkout(monkeypatch, manager, product.id, enabled=True)
+
+    checkout(db, make_user("customer").id, product.id)
+    switcher.join()
+
+    assert manager.is_hot(product.id)
+    assert manager.available(product.id) == 4
+    assert stock_after_flush(db, manager, product.id) == 4
+
+
+def test_disable_during_checkout_counts_the_sale_once(db, make_user, make_product, manager, monkeypatch):
+    product = make_product(stock=5)
+    manager.enable(db, product)
+    switcher = switch_mode_during_checkout(monkeypatch, manager, product.id, enabled=False)
+
+    checkout(db, make_user("customer").id, product.id)
+    switcher.join()
+
+    assert not manager.is_hot(product.id)
+    assert stock_after_flush(db, manager, product.id) == 4
+
+
+def test_checkout_without_units_left_writes_nothing(db, make_user, make_product, manager):
+    product = make_product(stock=1)
+    manager.enable(db, product)
+    checkout(db, make_user("customer").id, product.id)
+    orders_before = db.query(models.Order).count()
+
+    with pytest.raises(services.flash_sale.SoldOutError):
+        checkout(db, make_user("customer").id, product.id)
+
+    assert db.query(models.Order).count() == orders_before
+    assert stock_after_flush(db, manager, product.id) == 0
+
+
+def test_concurrent_shoppers_never_oversell(db, make_user, make_product, manager):
+    stock, shoppers = 20, 60
+    product_id = make_product(stock=stock).id
+    manager.enable(db, db.get(models.Product, product_id))
+    customers = [models.User(email=f"shopper{i}-{product_id}@example.com", hashed_password="x", full_name="Shopper", role=models.UserRole.CUSTOMER) for i in range(shoppers)]
+    db.add_all(customers)
+    db.commit()
+    customer_ids = [customer.id for customer in customers]
+    outcomes = []
+    stop = threading.Event()
+
+    def flusher():
+        while not stop.is_set():
+            try:
+                manager._flush_once()
+            except OperationalError:
+                pass # Lost a lock race with a checkout; the next round catches up.
+            stop.wait(0.01)
+
+    def shop(customer_id):
+        # What add-to-cart and place-order do, retrying SQLite "database is locked" like a client would.
+        if not manager.reserve(customer_id, product_id):
+            return "sold_out_at_cart"
+        with SessionLocal() as session:
+            for _ in range(20):
+                try:
+                    checkout(session, customer_id, product_id)
+                    return "order"
+                except services.flash_sale.SoldOutError:
+                    return "sold_out_at_checkout"
+                except OperationalError:
+                    session.rollback()
+            return "error"
+
+    flusher_thread = threading.Thread(target=flusher)
+    flusher_thread.start()
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            outcomes = list(pool.map(shop, customer_ids))
+    finally:
+        stop.set()
+        flusher_thread.join()
+
+    assert outcomes.count("order") == stock
+    assert outcomes.count("sold_out_at_cart") == shoppers - stock
+    assert manager.available(product_id) == 0
+    assert stock_after_flush(db, manager, product_id) == 0
+
+
+def test_expired_reservations_return_to_the_pool(db, make_user, make_product, manager, clock):
+    product = make_product(stock=1)
+    manager.enable(db, product)
+    first, second = make_user("customer").id, make_user("customer").id
+
+    assert manager.reserve(first, product.id)
+    assert not manager.reserve(second, product.id)
+
+    clock.now += manager.reservation_seconds + 1
+    manager.sweep_expired()
+    assert manager.available(product.id) == 1
+    assert manager.reserve(second, product.id)
+    with pytest.raises(services.flash_sale.SoldOutError):
+        checkout(db, first, product.id)
+    checkout(db, second, product.id)
+
+    assert manager.available(product.id) == 0
+    assert stock_after_flush(db, manager, product.id) == 0
+
+
+def test_restart_recovers_unflushed_sales_and_reservations(db, make_user, make_product, manager, monkeypatch):
+    product = make_product(stock=10)
+    manager.enable(db, product)
+    buyers = [make_user("customer").id for _ in range(3)]
+    waiting = make_user("customer").id
+    for customer_id in buyers:
+        assert manager.reserve(customer_id, product.id)
+        checkout(db, customer_id, product.id)
+    assert manager.reserve(waiting, product.id)
+
+    # Crash before the flusher ran: the sales are only in order_items, the reservation only in the log.
+    restarted = services.flash_sale.FlashSaleManager(log_path=manager.log_path)
+    monkeypatch.setattr(services.flash_sale, "manager", restarted)
+    restarted.load(db)
+
+    assert restarted.available(product.id) == 10 - 3 - 1
+    assert stock_after_flush(db, restarted, product.id) == 7
+    assert stock_after_flush(db, restarted, product.id) == 7 # A second flush finds nothing new to subtract.
+    checkout(db, waiting, product.id) # The recovered reservation still covers it.
+    assert restarted.available(product.id) == 6
+    assert stock_after_flush(db, restarted, product.id) == 6
@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta
+
+import models
+from services import job_queue
+
+
+def add_job(db, status, finished_days_ago=None):
+    finished_at = datetime.utcnow() - timedelta(days=finished_days_ago) if finished_days_ago is not None else None
+    job = models.Job(job_type="test_retention", status=status, finished_at=finished_at)
+    db.add(job)
+    db.commit()
+    return job.id
+
+
+def test_purge_deletes_only_finished_jobs_past_retention(db):
+    old_done = add_job(db, models.JobStatus.DONE, job_queue.JOB_RETENTION_DAYS + 1)
+    recent_done = add_job(db, models.JobStatus.DONE, 0)
+    old_dead = add_job(db, models.JobStatus.DEAD, job_queue.JOB_DEAD_RETENTION_DAYS + 1)
+    kept_dead = add_job(db, models.JobStatus.DEAD, job_queue.JOB_RETENTION_DAYS + 1)
+    queued = add_job(db, models.JobStatus.QUEUED)
+
+    assert job_queue.worker.purge_finished_jobs() >= 2
+
+    db.expire_all()
+    remaining = {job_id for (job_id,) in db.query(models.Job.id).filter(models.Job.job_type == "test_retention")}
+    assert remaining == {recent_done, kept_dead, queued}
+    assert old_done not in remaining and old_dead not in remaining
@@ -0,0 +1,40 @@
+import csv
+import io
+import time
+
+import crud
+import models
+from routers import artist
+
+SHIPPING = {"address": "1 Test Lane", "city": "Jaipur", "zip": "302001", "country": "IN", "paymentMethod": "COD"}
+
+
+def place_order(db, customer_id: int, product_id: int):
+    crud.add_item_to_cart(db, customer_id, product_id)
+    order = crud.create_order(db, customer_id, crud.get_cart_items(db, customer_id), SHIPPING)
+    crud.clear_customer_cart(db, customer_id)
+    return order
+
+
+def test_checkout_is_not_blocked_by_an_export_in_progress(db, make_user):
+    seller, customer = make_user("artist"), make_user("customer")
+    product = crud.create_product(db, seller.id, "Export Bowl", "Pottery", "desc", "notes", 25.0, 1000, "bowl.jpg")
+    pages = 3
+    for _ in range(pages * artist.EXPORT_PAGE_ROWS):
+        order = models.Order(customer_id=customer.id, total_amount_usd=25.0, shipping_address_line1="1", shipping_city="Jaipur", shipping_postal_code="1", shipping_country="IN", payment_method="COD")
+        order.items.append(models.OrderItem(product_id=product.id, quantity=1, price_at_purchase_usd=25.0))
+        db.add(order)
+    db.commit()
+
+    chunks = artist._order_export_chunks(seller.id, "csv", None, None)
+    body = [next(chunks), next(chunks)] # Header, then the first page: the download is mid-stream.
+    started = time.monotonic()
+    place_order(db, customer.id, product.id)
+    assert time.monotonic() - started < 2 # SQLite's busy timeout is 5 s; a held read lock would stall until it.
+    body.extend(chunks)
+
+    rows = list(csv.reader(io.StringIO("".join(body))))
+    assert rows[0] == artist.EXPORT_COLUMNS
+    order_ids = [int(row[0]) for row in rows[1:]]
+    assert order_ids == sorted(order_ids)
+    assert len(order_ids) == len(set(order_ids)) >= pages * artist.EXPORT_PAGE_ROWS
@@ -0,0 +1,15 @@
+import models
+from services.pricing_service import PricingEngine
+
+
+def test_suggest_queues_a_refresh_without_committing_the_callers_session(db):
+    pricing = PricingEngine()
+    pending = models.User(email="pending@example.com", hashed_password="x", full_name="Pending", role=models.UserRole.CUSTOMER)
+    db.add(pending)
+
+    assert pricing.suggest(db, "Pottery") is None # No snapshot yet: the route falls back to the AI.
+    db.rollback()
+
+    assert db.query(models.User).filter(models.User.email == "pending@example.com").count() == 0
+    queued = db.query(models.Job).filter(models.Job.job_type == "refresh_price_snapshot", models.Job.status == models.JobStatus.QUEUED)
+    assert queued.count() >= 1
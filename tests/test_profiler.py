@@ -0,0 +1,29 @@
+import asyncio
+import threading
+
+import anyio.to_thread
+
+from services import profiler
+
+
+def registered_profile():
+    return profiler.sampler._worker_threads.get(threading.get_ident())
+
+
+def test_worker_threads_are_attributed_to_the_profiled_request():
+    async def scenario():
+        profiler.install_thread_hooks()
+        outside = await anyio.to_thread.run_sync(registered_profile), await asyncio.to_thread(registered_profile)
+        profile = profiler.RequestProfile("GET", "/", "", "header")
+        token = profiler._current.set(profile)
+        try:
+            inside = await anyio.to_thread.run_sync(registered_profile), await asyncio.to_thread(registered_profile)
+        finally:
+            profiler._current.reset(token)
+        return outside, inside, profile
+
+    outside, inside, profile = asyncio.run(scenario())
+
+    assert outside == (None, None)
+    assert inside == (profile, profile)
+    assert profiler.sampler._worker_threads == {} # Unregistered when the call returns.